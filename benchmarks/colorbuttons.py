@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Memory and open latency of a window with 500 ColorButtons, comparing the
+# pooled ColorPicker against building a QColorDialog on each click, and the
+# number of style updates while dragging a picker slider.
+# python benchmarks/colorbuttons.py [--buttons 500] [--opens 500]
+import os
+import resource
+import sys
+import time
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from colorpecker.colorbutton import ColorButton, PickerPool  # noqa
+from PySide6 import QtGui, QtWidgets  # noqa
+
+
+def rss():
+    """ Returns the resident memory of this process in MB. """
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1048576
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(times, pct):
+    """ Returns the pct percentile of times in ms. """
+    times = sorted(times)
+    return times[min(len(times)-1, int(len(times)*pct/100))] * 1000
+
+
+def report(name, times, before):
+    print(f'{name:<12} first {times[0]*1000:7.2f}ms  p50 {percentile(times, 50):7.2f}ms  '
+        f'p99 {percentile(times, 99):7.2f}ms  memory +{rss()-before:.1f}MB')
+
+
+def openPooled(app, buttons):
+    """ Open and close the pooled picker from each button. """
+    times = []
+    for button in buttons:
+        start = time.perf_counter()
+        button.onColorPicker()
+        app.processEvents()
+        times.append(time.perf_counter() - start)
+        button._picker.close()
+    return times
+
+
+def openDialogs(app, buttons):
+    """ Open and close a new QColorDialog from each button, as ColorButton
+        did before the pool.
+    """
+    times = []
+    for button in buttons:
+        start = time.perf_counter()
+        dlg = QtWidgets.QColorDialog(button)
+        dlg.setOption(QtWidgets.QColorDialog.DontUseNativeDialog)
+        dlg.setCurrentColor(QtGui.QColor(button.color()))
+        dlg.show()
+        app.processEvents()
+        times.append(time.perf_counter() - start)
+        dlg.close()
+        dlg.deleteLater()
+    app.processEvents()
+    return times
+
+
+def dragPreview(app, button, steps):
+    """ Returns the number of style updates while dragging a slider. """
+    updates = 0
+    setStyleSheet = button.setStyleSheet
+    def countStyle(style):  # noqa
+        nonlocal updates
+        updates += 1
+        setStyleSheet(style)
+    button.setStyleSheet = countStyle
+    button.onColorPicker()
+    slider = button._picker.ids.rgb_r.ids.slider
+    start = time.perf_counter()
+    for i in range(steps):
+        slider.setValue(i % 256)
+        app.processEvents()
+    elapsed = time.perf_counter() - start
+    time.sleep(0.05)
+    app.processEvents()
+    button._picker.close()
+    return updates, elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='ColorButton pool benchmark')
+    parser.add_argument('--buttons', type=int, default=500, help='Number of buttons')
+    parser.add_argument('--opens', type=int, default=500, help='Number of picker opens')
+    parser.add_argument('--steps', type=int, default=1000, help='Slider drag steps')
+    opts = parser.parse_args()
+    app = QtWidgets.QApplication(sys.argv)
+    before = rss()
+    window = QtWidgets.QWidget()
+    layout = QtWidgets.QGridLayout(window)
+    pool = PickerPool()
+    buttons = []
+    start = time.perf_counter()
+    for i in range(opts.buttons):
+        button = ColorButton(color=f'#{(i*2654435761) & 0xffffff:06x}', pool=pool)
+        layout.addWidget(button, i // 25, i % 25)
+        buttons.append(button)
+    window.show()
+    app.processEvents()
+    print(f'{opts.buttons} buttons  created in {(time.perf_counter()-start)*1000:.1f}ms  memory +{rss()-before:.1f}MB')
+    opens = [buttons[i % len(buttons)] for i in range(opts.opens)]
+    before = rss()
+    report('pooled', openPooled(app, opens), before)
+    before = rss()
+    report('qcolordialog', openDialogs(app, opens), before)
+    updates, elapsed = dragPreview(app, buttons[0], opts.steps)
+    print(f'drag preview {opts.steps} steps in {elapsed*1000:.1f}ms  {updates} style updates')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Round-trip harness for color conversions. Converts colors out of rgb and
+# back through the scalar RgbColor path and the vectorized colorspace path,
+# then reports the max error in 8-bit levels, the number of colors off by
+# half a level or more and the throughput of each path. The
+# agreement column is the max difference between the scalar and vectorized
+# results. Chunks run in parallel on every core.
+#   python benchmarks/roundtrip.py                  # 1M random float colors
+#   python benchmarks/roundtrip.py --cube           # Every 8-bit color, 16.7M
+#   python benchmarks/roundtrip.py --paths hsl,text:hex --count 100000
+import multiprocessing
+import numpy
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from colorpecker.color import COLORFORMATS, RgbColor  # noqa
+from colorpecker.colorbuffer import ColorBuffer  # noqa
+from colorpecker import colorspace  # noqa
+
+CUBESIZE = 1 << 24
+CHUNKSIZE = 1 << 16
+
+
+def _scalarSpace(space):
+    """ Returns a scalar round trip through an RgbColor color space. """
+    fromfunc = getattr(RgbColor, f'from{space[0].upper()}{space[1:]}')
+    return lambda color: fromfunc(*getattr(color, space))
+
+
+def _scalarText(cformat):
+    """ Returns a scalar round trip through a text color format. """
+    return lambda color: RgbColor.fromText(color.format(cformat))
+
+
+def _vectorSpace(fromRgb, toRgb):
+    """ Returns a vectorized round trip through a colorspace transform. """
+    return lambda rgb: toRgb(fromRgb(rgb))
+
+
+def _vectorHex(rgb):
+    """ Round trip through ColorBuffer.hex and back from the hex bytes. """
+    pixels = numpy.concatenate([numpy.round(rgb*255), numpy.full((len(rgb), 1), 255)], axis=1).astype(numpy.uint8)
+    hexes = ColorBuffer.fromPixels(pixels).hex()
+    values = numpy.frombuffer(bytes.fromhex(''.join(h[1:] for h in hexes)), dtype=numpy.uint8)
+    return values.reshape(-1, 3) / 255.0
+
+
+# Path name: (scalar round trip or None, vectorized round trip or None)
+PATHS = {
+    'hsl': (_scalarSpace('hsl'), _vectorSpace(colorspace.rgb2hsl, colorspace.hsl2rgb)),
+    'hsv': (_scalarSpace('hsv'), _vectorSpace(colorspace.rgb2hsv, colorspace.hsv2rgb)),
+    'cmyk': (_scalarSpace('cmyk'), _vectorSpace(colorspace.rgb2cmyk, colorspace.cmyk2rgb)),
+    'lab': (None, _vectorSpace(colorspace.rgb2lab, colorspace.lab2rgb)),
+    'oklab': (None, _vectorSpace(colorspace.rgb2oklab, colorspace.oklab2rgb)),
+    'oklch': (None, _vectorSpace(colorspace.rgb2oklch, colorspace.oklch2rgb)),
+    'display-p3': (_scalarSpace('displayP3'), _vectorSpace(*colorspace.SPACES[colorspace.DISPLAYP3][:2])),
+    'rec2020': (_scalarSpace('rec2020'), _vectorSpace(*colorspace.SPACES[colorspace.REC2020][:2])),
+    'text:hex': (_scalarText(COLORFORMATS['hex']), _vectorHex),
+}
+PATHS.update({f'text:{name}': (_scalarText(cformat), None) for name, cformat in COLORFORMATS.items() if name != 'hex'})
+
+
+def chunkColors(start, count, cube, seed):
+    """ Returns (count, 3) rgb values on a 0-1 scale. Cube chunks are 8-bit
+        colors in order, otherwise random floats rounded to 3 decimals the
+        way RgbColor stores them.
+    """
+    if cube:
+        index = numpy.arange(start, min(start + count, CUBESIZE))
+        return numpy.stack([index >> 16, (index >> 8) & 255, index & 255], axis=-1) / 255.0
+    rand = numpy.random.default_rng(seed + start)
+    return numpy.round(rand.random((count, 3)), 3)
+
+
+def measure(rgb, result):
+    """ Returns (max error in 8-bit levels, mismatches, worst color). A
+        mismatch is off by half a level or more, enough to change an 8-bit
+        color.
+    """
+    error = numpy.abs(numpy.asarray(result, dtype=numpy.float64) - rgb).max(axis=1) * 255
+    mismatches = error >= 0.5
+    worst = int(error.argmax())
+    return float(error[worst]), int(mismatches.sum()), tuple(numpy.round(rgb[worst]*255).astype(int).tolist())
+
+
+def runChunk(args):
+    """ Run every path over one chunk, returns {path: stats}. """
+    start, count, cube, seed, paths, noscalar = args
+    rgb = chunkColors(start, count, cube, seed)
+    stats = {}
+    for name in paths:
+        scalar, vector = PATHS[name]
+        stat = stats[name] = {'count': len(rgb)}
+        sresult = vresult = None
+        if scalar is not None and not noscalar:
+            colors = [RgbColor(*values, scale=1) for values in rgb.tolist()]
+            began = time.perf_counter()
+            sresult = numpy.array([scalar(color).rgb for color in colors])
+            stat['stime'] = time.perf_counter() - began
+            stat['serror'], stat['smismatch'], stat['sworst'] = measure(rgb, sresult)
+        if vector is not None:
+            began = time.perf_counter()
+            vresult = vector(rgb)
+            stat['vtime'] = time.perf_counter() - began
+            stat['verror'], stat['vmismatch'], stat['vworst'] = measure(rgb, vresult)
+        if sresult is not None and vresult is not None:
+            stat['agree'] = float(numpy.abs(sresult - vresult).max() * 255)
+    return stats
+
+
+def merge(total, stats):
+    """ Merge the stats of one chunk into the totals. """
+    for name, stat in stats.items():
+        merged = total.setdefault(name, {'count': 0})
+        merged['count'] += stat['count']
+        for prefix in ('s', 'v'):
+            if f'{prefix}time' not in stat:
+                continue
+            merged[f'{prefix}time'] = merged.get(f'{prefix}time', 0) + stat[f'{prefix}time']
+            merged[f'{prefix}mismatch'] = merged.get(f'{prefix}mismatch', 0) + stat[f'{prefix}mismatch']
+            if stat[f'{prefix}error'] >= merged.get(f'{prefix}error', -1):
+                merged[f'{prefix}error'] = stat[f'{prefix}error']
+                merged[f'{prefix}worst'] = stat[f'{prefix}worst']
+        if 'agree' in stat:
+            merged['agree'] = max(merged.get('agree', 0), stat['agree'])
+
+
+def report(total, elapsed, workers):
+    """ Print the results table. Throughput is per core. """
+    def columns(stat, prefix):
+        if f'{prefix}time' not in stat:
+            return f'{"-":>9} {"-":>10} {"-":>12}'
+        rate = stat['count'] / stat[f'{prefix}time']
+        return f'{stat[prefix+"error"]:9.4f} {stat[prefix+"mismatch"]:10,} {rate:12,.0f}'
+    print(f'{"":14} {"---------- scalar RgbColor ----------":>33}  {"----------- vectorized -----------":>33}')
+    print(f'{"path":14} {"maxerr":>9} {"mismatches":>10} {"colors/s":>12}  '
+        f'{"maxerr":>9} {"mismatches":>10} {"colors/s":>12} {"agree":>8}  worst rgb')
+    for name, stat in total.items():
+        agree = f'{stat["agree"]:8.4f}' if 'agree' in stat else f'{"-":>8}'
+        worst = stat.get('sworst') or stat.get('vworst')
+        print(f'{name:14} {columns(stat, "s")}  {columns(stat, "v")} {agree}  {worst}')
+    count = next(iter(total.values()))['count']
+    print(f'{count:,} colors per path in {elapsed:.1f}s on {workers} workers, maxerr in 8-bit levels')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Color round-trip harness')
+    parser.add_argument('--cube', action='store_true', help='Sweep every 8-bit rgb color')
+    parser.add_argument('--count', type=int, default=1000000, help='Random colors to test')
+    parser.add_argument('--paths', default=','.join(PATHS), help=f'Comma separated paths: {",".join(PATHS)}')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--noscalar', action='store_true', help='Skip the slow scalar paths')
+    opts = parser.parse_args()
+    paths = opts.paths.split(',')
+    if unknown := [name for name in paths if name not in PATHS]:
+        parser.error(f'Unknown paths: {", ".join(unknown)}')
+    count = CUBESIZE if opts.cube else opts.count
+    chunks = [(start, min(CHUNKSIZE, count-start), opts.cube, opts.seed, paths, opts.noscalar)
+        for start in range(0, count, CHUNKSIZE)]
+    total, began = {}, time.perf_counter()
+    with multiprocessing.Pool(opts.workers) as pool:
+        for i, stats in enumerate(pool.imap_unordered(runChunk, chunks)):
+            merge(total, stats)
+            print(f'\r{i+1}/{len(chunks)} chunks', end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    report(total, time.perf_counter() - began, opts.workers)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Load test for colorpecker.service. Runs concurrent clients that each send
+# requests of mixed color strings and reports throughput and latency. By
+# default the service runs in this process, pass --socket to start a server
+# process and talk to it over a unix socket instead.
+# python benchmarks/serviceload.py [--clients 32] [--requests 200] [--size 100]
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+from colorpecker.service import ConversionService  # noqa
+
+FORMATS = ('hex', 'rgb255', 'hsl100')
+
+
+def corpus(count, unique=2000, seed=1):
+    """ Returns count color strings drawn from unique colors in a mix of
+        formats, roughly what a set of theme files looks like.
+    """
+    rand = random.Random(seed)
+    colors = []
+    for _ in range(unique):
+        r, g, b = (rand.randrange(256) for _ in range(3))
+        colors.append(rand.choice((
+            f'#{r:02x}{g:02x}{b:02x}',
+            f'rgb({r}, {g}, {b})',
+            f'rgba({r}, {g}, {b}, {rand.randrange(101)/100})',
+            f'hsl({rand.randrange(360)}, {rand.randrange(101)}%, {rand.randrange(101)}%)',
+        )))
+    return [rand.choice(colors) for _ in range(count)]
+
+
+def percentile(times, pct):
+    """ Returns the pct percentile of times in ms. """
+    times = sorted(times)
+    return times[min(len(times)-1, int(len(times)*pct/100))] * 1000
+
+
+async def localClient(service, texts, opts, latencies):
+    """ Send requests straight to an in-process service. """
+    for i in range(opts.requests):
+        batch = texts[i*opts.size:(i+1)*opts.size]
+        start = time.perf_counter()
+        await service.convertMany(batch, FORMATS[i % len(FORMATS)])
+        latencies.append(time.perf_counter() - start)
+
+
+async def socketClient(path, texts, opts, latencies):
+    """ Send requests one at a time over the unix socket. """
+    reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+    for i in range(opts.requests):
+        batch = texts[i*opts.size:(i+1)*opts.size]
+        request = {'id': i, 'colors': batch, 'format': FORMATS[i % len(FORMATS)]}
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise Exception(response['error'])
+    writer.close()
+
+
+async def waitForSocket(path, timeout=30):
+    """ Wait for the server process to start listening. """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise Exception(f'Server did not start on {path}')
+
+
+async def main(opts):
+    texts = [corpus(opts.requests * opts.size, seed=i) for i in range(opts.clients)]
+    latencies = []
+    if opts.socket:
+        cmd = [sys.executable, '-m', 'colorpecker.service', '--socket', opts.socket]
+        if opts.workers: cmd += ['--workers', str(opts.workers)]
+        if opts.threads: cmd += ['--threads']
+        server = subprocess.Popen(cmd, cwd=ROOT, stderr=subprocess.DEVNULL)
+        try:
+            await waitForSocket(opts.socket)
+            start = time.perf_counter()
+            await asyncio.gather(*(socketClient(opts.socket, t, opts, latencies) for t in texts))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        async with ConversionService(opts.workers, not opts.threads) as service:
+            start = time.perf_counter()
+            await asyncio.gather(*(localClient(service, t, opts, latencies) for t in texts))
+            elapsed = time.perf_counter() - start
+    total = opts.clients * opts.requests
+    print(f'{opts.clients} clients x {opts.requests} requests x {opts.size} colors '
+        f'({"socket" if opts.socket else "in-process"}, {"threads" if opts.threads else "processes"})')
+    print(f'throughput {total/elapsed:,.0f} requests/s  {total*opts.size/elapsed:,.0f} colors/s')
+    print(f'latency    p50 {percentile(latencies, 50):.2f}ms  p99 {percentile(latencies, 99):.2f}ms  '
+        f'max {max(latencies)*1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Color conversion service load test')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+    parser.add_argument('--size', type=int, default=100, help='Colors per request')
+    parser.add_argument('--workers', type=int, help='Service workers (default: cores)')
+    parser.add_argument('--threads', action='store_true', help='Use threads rather than processes')
+    parser.add_argument('--socket', help='Start a server on this unix socket and load it')
+    asyncio.run(main(parser.parse_args()))
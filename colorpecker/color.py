@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import re
 import colorsys
+import weakref
 from colorpecker import log  # noqa
+from colorpecker.colorspace import DISPLAYP3, REC2020, SRGB, convertRgb, gamutMap
 from collections import namedtuple, OrderedDict
 
 # Color modes
@@ -20,6 +22,15 @@ REGEX_HSL = re.compile(rf'hsla?\({_DEG}{_DELIM}{_NUM}{_DELIM}{_NUM}(?:{_DELIM}{_
 REGEX_HSV = re.compile(rf'hsva?\({_DEG}{_DELIM}{_NUM}{_DELIM}{_NUM}(?:{_DELIM}{_NUM})? *\)', re.I)
 REGEX_HEX = re.compile(r'((?:\#|0x)[a-f\d]{3,8})', re.I)
 
+# Interned RgbColors. Colors are held weakly, plus strong references to
+# the INTERNSIZE most recently interned so they survive between ticks.
+INTERNSIZE = 4096
+_INTERNED = weakref.WeakValueDictionary()
+_RECENT = OrderedDict()
+
+# Lookup table of two digit hex strings for each byte
+HEXBYTES = tuple(f'{i:02x}' for i in range(256))
+
 # Color Formats
 ColorFormat = namedtuple('ColorFormat', 'name,opaque,alpha')
 COLORFORMATS = OrderedDict({cf.name:cf for cf in [
@@ -48,6 +59,8 @@ class RgbColor:
     """ RGB color object. Externally the rgba are used on a 0-255 scale by
         default. Howeever, they are internally stored on a 0-1 scale.
     """
+    _cache = None  # Derived color spaces {name: (rgb, value)}, created on first use
+
     def __init__(self, r, g, b, a=1, scale=None):
         if scale is None:
             scale = 255 if any(v > 1 for v in (r,g,b)) else 1
@@ -57,10 +70,10 @@ class RgbColor:
         self.a = round(a, 3)  # 0-1
     
     cmyka = property(lambda self: self.cmyk + (self.a,))
-    hex = property(lambda self: '#'+''.join(f'{int(x*255):02x}' for x in self.rgb))
-    hexa = property(lambda self: '#'+''.join(f'{int(x*255):02x}' for x in self.rgba))
+    hex = property(lambda self: f'#{hexbyte(self.r)}{hexbyte(self.g)}{hexbyte(self.b)}')
+    hexa = property(lambda self: f'#{hexbyte(self.r)}{hexbyte(self.g)}{hexbyte(self.b)}{hexbyte(self.a)}')
     hsla = property(lambda self: self.hsl + (self.a,))
-    hsv = property(lambda self: colorsys.rgb_to_hsv(*self.rgb))
+    hsv = property(lambda self: self._cached('hsv', colorsys.rgb_to_hsv))
     hsva = property(lambda self: self.hsv + (self.a,))
     rgb = property(lambda self: (self.r, self.g, self.b))
     rgba = property(lambda self: (self.r, self.g, self.b, self.a))
@@ -77,25 +90,87 @@ class RgbColor:
     def __str__(self):
         return f'rgba{self.rgba}'
 
+    def __eq__(self, other):
+        if not isinstance(other, RgbColor):
+            return NotImplemented
+        return self.rgba == other.rgba
+
+    def __hash__(self):
+        return hash(self.rgba)
+
     @property
     def cmyk(self):
-        k = 1-max(self.rgb)
-        if k == 1: return 0,0,0,1
-        c = (1-self.r-k)/(1-float(k))
-        m = (1-self.g-k)/(1-float(k))
-        y = (1-self.b-k)/(1-float(k))
-        return c,m,y,k
+        return self._cached('cmyk', _rgb2cmyk)
+
+    @property
+    def displayP3(self):
+        """ Returns the (r,g,b) values in Display P3. """
+        return self._cached('displayP3', _rgb2space(DISPLAYP3))
 
     @property
     def hsl(self):
-        h,l,s = colorsys.rgb_to_hls(*self.rgb)
-        return h,s,l
+        return self._cached('hsl', _rgb2hsl)
+
+    @property
+    def rec2020(self):
+        """ Returns the (r,g,b) values in Rec.2020. """
+        return self._cached('rec2020', _rgb2space(REC2020))
+
+    def _cached(self, name, func):
+        """ Returns func(r,g,b), cached until the rgb values change. """
+        rgb = self.rgb
+        if self._cache is None:
+            self._cache = {}
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != rgb:
+            cached = self._cache[name] = (rgb, func(*rgb))
+        return cached[1]
 
     def format(self, cformat):
         """ Return a color formatted with the specified color format. """
         return cformat.opaque(self) if self.a == 1 else cformat.alpha(self)
 
-    def swap(self, id, value):
+    def inGamut(self):
+        """ Returns True if the rgb values are within sRGB. Colors created
+            from wide gamut or out of range hsl values may not be.
+        """
+        return all(0 <= x <= 1 for x in self.rgb)
+
+    def toGamut(self):
+        """ Returns the color mapped into sRGB by reducing its chroma, the
+            CSS Color 4 gamut mapping. Colors in gamut are returned as is.
+        """
+        if self.inGamut():
+            return self
+        return RgbColor(*gamutMap(self.rgb).tolist(), self.a, scale=1)
+
+    def intern(self):
+        """ Returns the shared instance equal to this color, so equal colors
+            share one object and its cached color spaces. Interned colors
+            are shared, they should not be modified.
+        """
+        key = self.rgba
+        color = _INTERNED.get(key)
+        if color is None:
+            color = _INTERNED[key] = self
+        return _remember(key, color)
+
+    @classmethod
+    def interned(cls, r, g, b, a=1, scale=None):
+        """ Returns the shared instance for these values, the same as
+            RgbColor(r,g,b,a,scale).intern() but a new color is only built
+            when there isn't one already. Slider drags revisit the same
+            colors, so most ticks allocate nothing but the key.
+        """
+        if scale is None:
+            scale = 255 if any(v > 1 for v in (r,g,b)) else 1
+        key = (round(r / float(scale), 3), round(g / float(scale), 3), round(b / float(scale), 3), round(a, 3))
+        color = _INTERNED.get(key)
+        if color is None:
+            color = _INTERNED[key] = cls(*key, scale=1)
+        return _remember(key, color)
+
+    def swap(self, id, value, interned=False):
         """ Returns a copy of the current color with id value swapped. """
         if id in 'rgba': mode = 'rgba'
         elif id in 'hsv': mode = 'hsva'
@@ -105,32 +180,46 @@ class RgbColor:
         xcolor = list(getattr(self, mode))
         xcolor[i] = value
         funcname = f'from{mode.title()[:-1]}'
-        return getattr(RgbColor, funcname)(*xcolor)
+        return getattr(RgbColor, funcname)(*xcolor, interned=interned)
 
     @classmethod
-    def fromCmyk(cls, c,m,y,k,a=1):
+    def fromCmyk(cls, c,m,y,k,a=1, interned=False):
         """ Creates an RgbColor from cmyk values. """
         r = round((1-c)*(1-k), 3)
         g = round((1-m)*(1-k), 3)
         b = round((1-y)*(1-k), 3)
-        return cls(r,g,b,a)
+        return (cls.interned if interned else cls)(r,g,b,a, scale=1)
             
     @classmethod
-    def fromHsl(cls, h,s,l,a=1):
+    def fromDisplayP3(cls, r,g,b,a=1):
+        """ Creates an RgbColor from Display P3 values on a 0-1 scale. Wide
+            gamut colors are kept out of range, see toGamut().
+        """
+        return cls(*convertRgb((r,g,b), DISPLAYP3, SRGB).tolist(), a, scale=1)
+
+    @classmethod
+    def fromHsl(cls, h,s,l,a=1, interned=False):
         """ Creates an RgbColor from hsl values. Note: The swapped s & l
             arguments, colorsys did things backwards from normal.
         """
-        return cls(*colorsys.hls_to_rgb(h,l,s)+(a,))
+        return (cls.interned if interned else cls)(*colorsys.hls_to_rgb(h,l,s)+(a,), scale=1)
 
     @classmethod
-    def fromHsv(cls, h,s,v,a=1):
+    def fromHsv(cls, h,s,v,a=1, interned=False):
         """ Creates an RgbColor from hsv values. """
-        return cls(*colorsys.hsv_to_rgb(h,s,v)+(a,))
+        return (cls.interned if interned else cls)(*colorsys.hsv_to_rgb(h,s,v)+(a,), scale=1)
+
+    @classmethod
+    def fromRec2020(cls, r,g,b,a=1):
+        """ Creates an RgbColor from Rec.2020 values on a 0-1 scale. Wide
+            gamut colors are kept out of range, see toGamut().
+        """
+        return cls(*convertRgb((r,g,b), REC2020, SRGB).tolist(), a, scale=1)
     
     @classmethod
-    def fromRgb(cls, r,g,b,a=1):
+    def fromRgb(cls, r,g,b,a=1, interned=False):
         """ Convenience function to create an RgbColor. """
-        return cls(r,g,b,a)
+        return (cls.interned if interned else cls)(r,g,b,a)
     
     @classmethod
     def fromHex(cls, text):
@@ -138,7 +227,7 @@ class RgbColor:
         if matches := re.findall(REGEX_HEX, text):
             try:
                 hexa = matches[0].lower()
-                log.info(f'Parsing hex color {hexa}')
+                log.debug(f'Parsing hex color {hexa}')
                 if hexa.startswith('#'): hexa = hexa[1:]
                 if hexa.startswith('0x'): hexa = hexa[2:]
                 match len(hexa):
@@ -159,7 +248,7 @@ class RgbColor:
         """ Creates an RgbColor from an hsl string. """
         if matches := re.findall(REGEX_HSL, text):
             try:
-                log.info(f'Parsing hsl color {text}')
+                log.debug(f'Parsing hsl color {text}')
                 hsla = text2vals(matches[0], (360,100,100,1), (0,0,0,1))
                 return RgbColor.fromHsl(*hsla)
             except Exception:
@@ -171,7 +260,7 @@ class RgbColor:
         """ Creates an RgbColor from an hsv string. """
         if matches := re.findall(REGEX_HSV, text):
             try:
-                log.info(f'Parsing hsv color {text}')
+                log.debug(f'Parsing hsv color {text}')
                 hsva = text2vals(matches[0], (360,100,100,1), (0,0,0,1))
                 return RgbColor.fromHsv(*hsva)
             except Exception:
@@ -183,7 +272,7 @@ class RgbColor:
         """ Creates an RgbColor from an rgb string. """
         if matches := re.findall(REGEX_RGB, text):
             try:
-                log.info(f'Parsing rgb color {text}')
+                log.debug(f'Parsing rgb color {text}')
                 rgba = text2vals(matches[0], (255,255,255,1), (0,0,0,1))
                 return RgbColor.fromRgb(*rgba)
             except Exception:
@@ -204,6 +293,17 @@ class RgbColor:
         raise Exception(f'Unknown color format: {text}')
 
 
+def _remember(key, color):
+    """ Keep a strong reference to one of the INTERNSIZE most recently
+        interned colors and return it.
+    """
+    _RECENT[key] = color
+    _RECENT.move_to_end(key)
+    if len(_RECENT) > INTERNSIZE:
+        _RECENT.popitem(last=False)
+    return color
+
+
 def text2vals(values, scales, defaults):
     """ Converts a text strings to numbers. """
     result = [None] * len(defaults)
@@ -224,3 +324,29 @@ def text2vals(values, scales, defaults):
         scales = [1] * len(result)
     # Return the result values
     return (round(result[i] / float(scales[i]), 3) for i in range(len(result)))
+
+
+def hexbyte(value):
+    """ Converts a 0-1 value to a two digit hex string. """
+    return HEXBYTES[min(max(round(value*255), 0), 255)]
+
+
+def _rgb2cmyk(r, g, b):
+    """ Converts rgb to cmyk values. """
+    k = 1-max(r, g, b)
+    if k == 1: return 0,0,0,1
+    c = (1-r-k)/(1-float(k))
+    m = (1-g-k)/(1-float(k))
+    y = (1-b-k)/(1-float(k))
+    return c,m,y,k
+
+
+def _rgb2space(space):
+    """ Returns a function converting sRGB r,g,b to the RGB space. """
+    return lambda r, g, b: tuple(convertRgb((r, g, b), SRGB, space).tolist())
+
+
+def _rgb2hsl(r, g, b):
+    """ Converts rgb to hsl values, colorsys returns them as hls. """
+    h,l,s = colorsys.rgb_to_hls(r, g, b)
+    return h,s,l
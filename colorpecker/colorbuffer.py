@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from colorpecker.color import HEXBYTES, RgbColor
+
+# Colors are packed as big-endian 0xRRGGBBAA so the bytes of the buffer are
+# in RGBA order, both in memory and in saved files.
+DTYPE = numpy.dtype('>u4')
+HEXTABLE = numpy.array(HEXBYTES, dtype='S2')
+
+
+class ColorBuffer:
+    """ Compact array of colors stored as packed 32-bit RGBA ints. Each color
+        takes 4 bytes rather than a few hundred for an RgbColor object.
+        Conversion to and from RgbColor is lossless for 8-bit colors, which
+        RgbColor's 3 decimal rounding always preserves.
+    """
+
+    def __init__(self, values=None):
+        values = numpy.asarray(values if values is not None else [], dtype=numpy.int64)
+        self._data = values.astype(DTYPE)       # Packed colors, may have spare capacity
+        self._size = len(self._data)            # Number of colors in use
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for value in self.values:
+            yield unpack(value)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColorBuffer(self.values[index])
+        return unpack(self.values[index])
+
+    def __setitem__(self, index, color):
+        self.values[index] = pack(color)
+
+    def __str__(self):
+        return f'ColorBuffer({self._size} colors)'
+
+    @property
+    def values(self):
+        """ Returns the packed uint32 colors in use, this is not a copy. """
+        return self._data[:self._size]
+
+    @property
+    def pixels(self):
+        """ Returns the colors as a (n, 4) uint8 RGBA array, this is not a copy. """
+        return self.values.view(numpy.uint8).reshape(-1, 4)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @classmethod
+    def fromColors(cls, colors):
+        """ Create a ColorBuffer from an iterable of RgbColors. """
+        return cls([pack(color) for color in colors])
+
+    @classmethod
+    def fromPixels(cls, pixels):
+        """ Create a ColorBuffer from (..., 4) uint8 RGBA pixels. """
+        pixels = numpy.ascontiguousarray(pixels, dtype=numpy.uint8).reshape(-1, 4)
+        buffer = cls()
+        buffer._data = pixels.view(DTYPE).ravel().copy()
+        buffer._size = len(buffer._data)
+        return buffer
+
+    @classmethod
+    def load(cls, filepath):
+        """ Load a ColorBuffer from a raw file of RGBA bytes. """
+        buffer = cls()
+        buffer._data = numpy.fromfile(filepath, dtype=DTYPE)
+        buffer._size = len(buffer._data)
+        return buffer
+
+    def save(self, filepath):
+        """ Save the colors to a raw file of RGBA bytes. """
+        self.values.tofile(filepath)
+
+    def append(self, color):
+        """ Append an RgbColor, growing the capacity by doubling. """
+        if self._size == len(self._data):
+            self._reserve(max(16, self._size*2))
+        self._data[self._size] = pack(color)
+        self._size += 1
+
+    def extend(self, colors):
+        """ Append an iterable of RgbColors or another ColorBuffer. """
+        values = colors.values if isinstance(colors, ColorBuffer) else [pack(color) for color in colors]
+        values = numpy.asarray(values, dtype=numpy.int64).astype(DTYPE)
+        if self._size + len(values) > len(self._data):
+            self._reserve(max(self._size + len(values), self._size*2))
+        self._data[self._size:self._size+len(values)] = values
+        self._size += len(values)
+
+    def toColors(self):
+        """ Returns a list of RgbColors. """
+        return list(self)
+
+    def hex(self, alpha=False):
+        """ Returns a list of hex strings, '#rrggbb' or '#rrggbbaa' if alpha
+            is True. Every color is encoded at once through HEXTABLE.
+        """
+        pixels = self.pixels if alpha else self.pixels[:,:3]
+        digits = numpy.ascontiguousarray(HEXTABLE[pixels]).view(f'S{pixels.shape[1]*2}').ravel()
+        return ['#'+value for value in digits.astype(str).tolist()]
+
+    def _reserve(self, capacity):
+        """ Grow the underlying array to capacity colors. """
+        data = numpy.zeros(capacity, dtype=DTYPE)
+        data[:self._size] = self.values
+        self._data = data
+
+
+def pack(color):
+    """ Returns an RgbColor packed into a 0xRRGGBBAA int. """
+    r, g, b, a = (min(max(round(x*255), 0), 255) for x in color.rgba)
+    return (r << 24) | (g << 16) | (b << 8) | a
+
+
+def unpack(value):
+    """ Returns an RgbColor from a packed 0xRRGGBBAA int. """
+    value = int(value)
+    return RgbColor(value >> 24, (value >> 16) & 255, (value >> 8) & 255, (value & 255) / 255.0, scale=255)
@@ -1,60 +1,186 @@
 # -*- coding: utf-8 -*-
 # https://www.pythonguis.com/widgets/qcolorbutton-a-color-selector-tool-for-pyqt/
-from PySide6 import QtGui, QtWidgets
+import warnings
+from colorpecker import log  # noqa
+from colorpecker.color import RgbColor
+from colorpecker.colorpicker import ColorPicker
+from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import Qt, Signal
 
+PREVIEWINTERVAL = 30    # Min milliseconds between button style updates
+
+
+class PickerPool:
+    """ Pool of ColorPickers shared by every ColorButton. Building a picker
+        loads its template, settings menu and history, so pickers are only
+        created when a button is first clicked and are reused after being
+        closed. A screen of hundreds of buttons costs one picker, not one
+        dialog per click.
+    """
+
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize      # Max idle pickers kept for reuse
+        self._idle = []             # Closed pickers ready for reuse
+        self._owners = {}           # Open pickers {picker: button}
+
+    def acquire(self, button):
+        """ Returns a picker for button, reusing an idle one if available.
+            If button already has a picker open the same one is returned.
+        """
+        for picker, owner in self._owners.items():
+            if owner is button:
+                return picker
+        picker = self._idle.pop() if self._idle else self._create()
+        self._owners[picker] = button
+        return picker
+
+    def release(self, picker):
+        """ Return picker to the pool, keeping at most maxsize idle. """
+        button = self._owners.pop(picker, None)
+        if button is not None:
+            button._picker = None
+            try:
+                picker.colorChanged.disconnect(button._pickerColorChanged)
+                picker.cancelled.disconnect(button._pickerCancelled)
+            except RuntimeError:
+                pass  # Button was deleted while the picker was open
+        if len(self._idle) < self.maxsize:
+            self._idle.append(picker)
+        else:
+            picker.deleteLater()
+
+    def clear(self):
+        """ Delete all idle pickers. """
+        for picker in self._idle:
+            picker.deleteLater()
+        self._idle = []
+
+    def _create(self):
+        """ Create a new picker for the pool. """
+        log.debug('Creating pooled ColorPicker')
+        picker = ColorPicker()
+        picker.closed.connect(lambda: self.release(picker))
+        return picker
+
+
+# Pool shared by all ColorButtons
+POOL = PickerPool()
+
 
 class ColorButton(QtWidgets.QPushButton):
     """ Custom Qt Widget to show a chosen color.
-        Left-clicking the button shows the color-chooser, while
-        right-clicking resets the color to None (no-color).
+        Left-clicking the button shows a shared ColorPicker, while
+        right-clicking resets the color to None (no-color). Changes in
+        the picker are applied live, the button style is only updated
+        once every PREVIEWINTERVAL ms while dragging. Pressing escape in
+        the picker restores the color from when it was opened. Colors
+        are emitted as QColor names, #aarrggbb when showing alpha.
     """
     colorChanged = Signal(object)
 
-    def __init__(self, *args, color=None, **kwargs):
+    def __init__(self, *args, color=None, pool=POOL, **kwargs):
         super(ColorButton, self).__init__(*args, **kwargs)
-        self._color = None                          # Current selected color
+        self._color = color                         # Current selected color
         self._default = color                       # Default color
         self._showAlpha = False                     # Show alpha channel
-        self._showButtons = True                    # Show buttons
+        self._showButtons = True                    # Deprecated, the picker has no buttons
+        self._pool = pool                           # Pool to borrow a picker from
+        self._picker = None                         # Picker while it's open
+        self._pickerColor = None                    # Color when the picker was opened
+        self._styleTimer = None                     # Throttles style updates
         self.pressed.connect(self.onColorPicker)
         self.setProperty('class', 'colorbutton')
-        self.setColor(self._default)
+        self._updateStyle()
 
     def setColor(self, color):
         if color != self._color:
             self._color = color
             self.colorChanged.emit(color)
-        if self._color:
-            self.setStyleSheet(f'[class=colorbutton] {{ background-color: {self._color}; }}')
-        else:
-            self.setStyleSheet('')
-    
+            self._queueStyle()
+
     def setShowAlpha(self, value):
         self._showAlpha = value
-    
+
     def setShowButtons(self, value):
+        """ Deprecated, the picker applies changes live and has no Ok or
+            Cancel buttons. Pressing escape in the picker cancels instead.
+        """
+        warnings.warn('ColorButton.setShowButtons() has no effect, press escape in the picker to cancel',
+            DeprecationWarning, stacklevel=2)
         self._showButtons = value
 
     def color(self):
         return self._color
 
     def onColorPicker(self):
-        """ Show color-picker dialog to select color.
-            Qt will use the native dialog by default.
-        """
-        dlg = QtWidgets.QColorDialog(self)
-        dlg.setOption(QtWidgets.QColorDialog.DontUseNativeDialog)
-        if not self._showButtons: dlg.setOption(QtWidgets.QColorDialog.NoButtons)
-        if self._showAlpha: dlg.setOption(QtWidgets.QColorDialog.ShowAlphaChannel)
-        dlg.setStyleSheet('QColorDialog { background-color: #222222; }')
-        dlg.currentColorChanged.connect(lambda c: self.setColor(dlg.currentColor().name()))
-        if self._color:
-            dlg.setCurrentColor(QtGui.QColor(self._color))
-        if dlg.exec_():
-            self.setColor(dlg.currentColor().name())
+        """ Show a pooled color picker to select the color. """
+        picker = self._pool.acquire(self)
+        if picker is not self._picker:
+            # Set the color before connecting so opening doesn't change it
+            self._picker = picker
+            self._pickerColor = self._color
+            picker.ids.a.setVisible(self._showAlpha)
+            picker.setColor(self._rgbColor() or RgbColor(1,1,1))
+            picker.colorChanged.connect(self._pickerColorChanged)
+            picker.cancelled.connect(self._pickerCancelled)
+        picker.show(self.mapToGlobal(self.rect().bottomLeft()))
+        picker.raise_()
+        picker.activateWindow()
 
     def mousePressEvent(self, e):
         if e.button() == Qt.RightButton:
             self.setColor(self._default)
         return super(ColorButton, self).mousePressEvent(e)
+
+    def _pickerColorChanged(self, color):
+        """ Called when the color in our picker changed. Emits the name Qt
+            uses, so hosts can pass it to QColor() as with QColorDialog.
+        """
+        qcolor = QtGui.QColor.fromRgbF(*color.rgba)
+        self.setColor(qcolor.name(QtGui.QColor.HexArgb if self._showAlpha else QtGui.QColor.HexRgb))
+
+    def _pickerCancelled(self):
+        """ Called when escape is pressed in our picker. Restores the color
+            from when the picker was opened and closes it.
+        """
+        self.setColor(self._pickerColor)
+        self._picker.close()
+
+    def _rgbColor(self):
+        """ Returns the current color as an RgbColor or None. Strings are
+            read the way QColor reads them (#aarrggbb, names), then as any
+            other color text RgbColor understands (rgb(), hsl()).
+        """
+        if not self._color or isinstance(self._color, RgbColor):
+            return self._color or None
+        qcolor = QtGui.QColor(self._color)
+        if qcolor.isValid():
+            return RgbColor(*qcolor.getRgbF(), scale=1)
+        try:
+            return RgbColor.fromText(self._color)
+        except Exception:
+            log.warning(f'Unable to parse color {self._color}')
+            return None
+
+    def _queueStyle(self):
+        """ Update the style at most once per PREVIEWINTERVAL. Each style
+            change makes Qt re-polish the button, which adds up quickly
+            when a picker slider is dragged.
+        """
+        if self._styleTimer is None:
+            self._styleTimer = QtCore.QTimer(self)
+            self._styleTimer.setSingleShot(True)
+            self._styleTimer.setInterval(PREVIEWINTERVAL)
+            self._styleTimer.timeout.connect(self._updateStyle)
+        if not self._styleTimer.isActive():
+            self._styleTimer.start()
+
+    def _updateStyle(self):
+        """ Update the button background to the current color. """
+        style = ''
+        color = self._rgbColor()
+        if color:
+            r,g,b = (round(x*255) for x in color.rgb)
+            style = f'[class=colorbutton] {{ background-color: rgba({r},{g},{b},{color.a}); }}'
+        if style != self.styleSheet():
+            self.setStyleSheet(style)
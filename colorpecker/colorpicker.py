@@ -2,28 +2,46 @@
 from colorpecker import log  # noqa
 from colorpecker.color import COLORFORMATS, RgbColor
 from colorpecker.color import RGB, HSL, HSV, CMYK
+from colorpecker.colorscale import INCREASING, interpolate, toColors
+from colorpecker.colorslider import ColorSlider
+from colorpecker.contrast import AA, AA_LARGE, AAA, contrastRatio, luminance
+from colorpecker.extract import extractFromImage
+from colorpecker.history import sharedHistory
+from colorpecker.imageviewer import ImageViewer
 from colorpecker.magnifier import Magnifier
+from colorpecker.palette import PALETTEFORMATS, PaletteEntry, PaletteModel, readPalette, writePalette
 from colorpecker.settings import Settings
 from os.path import dirname, normpath
 from PySide6 import QtGui, QtWidgets
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
 from qtemplate import QTemplateWidget
 
 
 class ColorPicker(QTemplateWidget):
     TMPL = normpath(f'{dirname(__file__)}/resources/colorpicker.tmpl')
+    colorChanged = Signal(object)       # Called with the RgbColor on any change
+    closed = Signal()                   # Called when the window is closed
+    cancelled = Signal()                # Called when escape is pressed outside a text edit
 
     def __init__(self, color=None):
         super(ColorPicker, self).__init__()
         self.mode = RGB                         # Current slider mode
         self.color = RgbColor(0,0,0)            # Current color in self.mode format
         self.cformat = COLORFORMATS['hex']      # Default to hex
-        self.settings = Settings(self)          # Settings object
+        self.swatches = []                      # Colors extracted from a region
+        self.paletteModel = PaletteModel(self)  # Colors shown in the palette panel
+        self.history = sharedHistory()          # Persistent history of picked colors
+        self.contrastColor = None               # Background to show contrast against
+        self._contrastLum = None                # Cached luminance of contrastColor
+        self.cvd = None                         # Color vision deficiency to preview
         self._magnifier = None                  # Magnifier window
+        self._viewer = None                     # ImageViewer window
+        self.settings = Settings(self)          # Settings object
         self._shiftColor = None                 # color value when shift pressed
         self._textColor = None                  # color before text edited
         self._eyedropColor = None               # color value when eyedrop opened
         self._updating = False                  # Ignore other slider changes
+        self.ids.palette.setModel(self.paletteModel)
         self.setColor(color)                    # Set the specfied color
 
     def __str__(self):
@@ -41,21 +59,106 @@ class ColorPicker(QTemplateWidget):
         self.move(pos)
         super(ColorPicker, self).show()
 
+    def closeEvent(self, event):
+        """ Let owners of a shared picker know it was closed. """
+        super(ColorPicker, self).closeEvent(event)
+        self.closed.emit()
+
     def setColor(self, color):
         """ Try really hard to read the text format and set the color. """
         try:
             if isinstance(color, RgbColor):
                 self.color = color
             elif isinstance(color, (tuple, list)):
-                self.color = RgbColor(*color)
+                self.color = RgbColor.interned(*color)
             elif isinstance(color, str):
-                self.color = RgbColor.fromText(color)
+                self.color = RgbColor.fromText(color).intern()
             self._updateSliderValues()
             self._updateDisplay()
         except Exception:
             log.exception(f'Unable to parse color {color}')
             raise
 
+    def extractSwatches(self, image, count=8):
+        """ Extract the dominant colors from a QImage or image filepath into
+            self.swatches and select the most common one.
+        """
+        self.swatches = [swatch.color for swatch in extractFromImage(image, count)]
+        log.info(f'Extracted swatches: {", ".join(color.hex for color in self.swatches)}')
+        for color in self.swatches:
+            self.addToPalette(color)
+        if self.swatches:
+            self.setColor(self.swatches[0])
+        return self.swatches
+
+    def setContrastColor(self, color):
+        """ Set the background color to show the contrast ratio against.
+            Set to None to hide the contrast readout.
+        """
+        self.contrastColor = color
+        self._contrastLum = luminance(color.rgb) if color else None
+        self._updateContrastDisplay()
+
+    def setCvd(self, cvd):
+        """ Set the color vision deficiency previewed in the magnifier. """
+        self.cvd = cvd
+        if self._magnifier:
+            self._magnifier.setCvd(cvd)
+
+    def openImage(self, filepath=None):
+        """ Open an image file in an ImageViewer and start the eyedropper
+            on it. Prompts for the filepath if not specified.
+        """
+        if not filepath:
+            filters = 'Images (*.png *.jpg *.jpeg *.tif *.tiff *.bmp *.raw *.rgba)'
+            filepath, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open Image', '', filters)
+            if not filepath: return
+        try:
+            viewer = ImageViewer(filepath)
+        except Exception as err:
+            log.error(err)
+            QtWidgets.QMessageBox.warning(self, 'Open Image', str(err))
+            return
+        if self._viewer:
+            self._viewer.close()
+        self._viewer = viewer
+        self._viewer.show()
+        self._eyedropClicked()
+
+    def addToPalette(self, color=None, name=None):
+        """ Add a color to the palette panel, defaults to the current color. """
+        color = color or self.color
+        self.paletteModel.addEntry(PaletteEntry(name or color.hex, color))
+        self._showPalette()
+
+    def openPalette(self, filepath=None):
+        """ Load a palette file into the palette panel. Prompts for the
+            filepath if not specified.
+        """
+        if not filepath:
+            filters = f'Palettes ({" ".join("*"+ext for ext in PALETTEFORMATS)})'
+            filepath, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open Palette', '', filters)
+            if not filepath: return
+        try:
+            self.paletteModel.setEntries(readPalette(filepath))
+        except Exception as err:
+            log.error(f'Unable to read palette {filepath}: {err}')
+            QtWidgets.QMessageBox.warning(self, 'Open Palette', f'Unable to read palette {filepath}: {err}')
+            return
+        log.info(f'Loaded {self.paletteModel.rowCount()} colors from {filepath}')
+        self._showPalette()
+
+    def savePalette(self, filepath=None):
+        """ Save the palette panel to a palette file. Prompts for the
+            filepath if not specified.
+        """
+        if not filepath:
+            filters = ';;'.join(f'{ext[1:].upper()} (*{ext})' for ext in PALETTEFORMATS)
+            filepath, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Save Palette', '', filters)
+            if not filepath: return
+        writePalette(filepath, self.paletteModel.entries(), cformat=self.cformat)
+        log.info(f'Saved {self.paletteModel.rowCount()} colors to {filepath}')
+
     def setColorFormat(self, cformat):
         """ Set the color format from one of color.COLORFORMATS. """
         self.cformat = cformat
@@ -65,19 +168,23 @@ class ColorPicker(QTemplateWidget):
     def keyPressEvent(self, event):
         """ When shift is pressed, we save the color to help with calculating
             a full brightness color change. When ctrl+v is pressed, we read the
-            clipboard and attempt to load the specified color from text.
+            clipboard and attempt to load the specified color from text. Escape
+            reverts a text edit in progress, otherwise it emits cancelled.
         """
         if event.matches(QtGui.QKeySequence.Paste):
             clipboard = QtGui.QClipboard()
             mimedata = clipboard.mimeData()
             if mimedata.hasText():
                 self.setColor(mimedata.text())
+                self.history.add(self.color)
         match event.key():
             case Qt.Key_Shift:
                 self._shiftColor = self.color
             case Qt.Key_Escape:
                 if self._textColor:
                     self.setColor(self._textColor)
+                else:
+                    self.cancelled.emit()
                 self._textColor = None
                 self.setFocus()
         super().keyPressEvent(event)
@@ -93,22 +200,46 @@ class ColorPicker(QTemplateWidget):
         if not self._magnifier:
             self._magnifier = Magnifier(parent=self)
             self._magnifier.colorChanged.connect(self._eyedropColorChanged)
+            self._magnifier.colorSelected.connect(self._eyedropColorSelected)
+            self._magnifier.regionSelected.connect(self._eyedropRegionSelected)
             self._magnifier.cancelled.connect(self._eyedropCancelled)
+            self._magnifier.setCvd(self.cvd)
+        viewer = self._viewer if self._viewer and self._viewer.isVisible() else None
+        self._magnifier.setViewer(viewer)
         self._eyedropColor = self.color
         self._magnifier.show()
     
     def _eyedropColorChanged(self, qcolor):
         rgb = tuple(round(x/255.0,3) for x in qcolor.getRgb())
-        self.color = RgbColor(*rgb)
+        self.color = RgbColor.interned(*rgb)
         self._updateSliderValues()
         self._updateDisplay()
     
+    def _eyedropColorSelected(self, qcolor):
+        """ Called when the eyedrop color selection was committed. """
+        self.history.add(self.color)
+
+    def _eyedropRegionSelected(self, image):
+        """ Called when a region was dragged with the eyedropper. """
+        self.extractSwatches(image)
+
     def _eyedropCancelled(self):
         """ Called when the eyedrop color selection was cancelled. """
         self.color = self._eyedropColor
         self._updateSliderValues()
         self._updateDisplay()
 
+    def _paletteClicked(self, index):
+        """ Called when a palette entry was clicked. """
+        self.setColor(self.paletteModel.color(index.row()))
+
+    def _showPalette(self):
+        """ Show the palette panel and resize the window to fit. """
+        if not self.ids.palettewrap.isVisible():
+            self.ids.palettewrap.setVisible(True)
+            self.updateGeometry()
+            self.adjustSize()
+
     def _textEdited(self):
         if self._textColor is None:
             log.info(f'_textEdited; {self.color}')
@@ -117,6 +248,7 @@ class ColorPicker(QTemplateWidget):
     def _textReturnPressed(self):
         try:
             self.setColor(self.ids.text.text())
+            self.history.add(self.color)
         except Exception:
             if self._textColor:
                 self.setColor(self._textColor)
@@ -154,7 +286,7 @@ class ColorPicker(QTemplateWidget):
                     pct = round(1-((svalue-value) / float(svalue)), 3)
                     r,g,b = [min(max(sc*pct,0),1) for sc in self._shiftColor.rgb]
             # Update the ui
-            self.color = RgbColor.fromRgb(r,g,b,a)
+            self.color = RgbColor.fromRgb(r,g,b,a, interned=True)
             if self._shiftColor:
                 self._updateSliderValues()
             self._updateDisplay()
@@ -166,7 +298,7 @@ class ColorPicker(QTemplateWidget):
             s = self.ids.hsl_s.value / float(self.ids.hsl_s.max)
             l = self.ids.hsl_l.value / float(self.ids.hsl_l.max)
             a = self.ids.a.value / float(self.ids.a.max)
-            self.color = RgbColor.fromHsl(h,s,l,a)
+            self.color = RgbColor.fromHsl(h,s,l,a, interned=True)
             self._updateDisplay()
 
     def _hsvChanged(self, value):
@@ -176,7 +308,7 @@ class ColorPicker(QTemplateWidget):
             s = self.ids.hsv_s.value / float(self.ids.hsv_s.max)
             v = self.ids.hsv_v.value / float(self.ids.hsv_v.max)
             a = self.ids.a.value / float(self.ids.a.max)
-            self.color = RgbColor.fromHsv(h,s,v,a)
+            self.color = RgbColor.fromHsv(h,s,v,a, interned=True)
             self._updateDisplay()
         
     def _cmykChanged(self, value):
@@ -187,13 +319,13 @@ class ColorPicker(QTemplateWidget):
             y = self.ids.cmyk_y.value / float(self.ids.cmyk_y.max)
             k = self.ids.cmyk_k.value / float(self.ids.cmyk_k.max)
             a = self.ids.a.value / float(self.ids.a.max)
-            self.color = RgbColor.fromCmyk(c,m,y,k,a)
+            self.color = RgbColor.fromCmyk(c,m,y,k,a, interned=True)
             self._updateDisplay()
 
     def _aChanged(self, a):
         """ Called when the opacity slider value has changed. """
         if not self._updating:
-            self.color.a = self.ids.a.value / float(self.ids.a.max)
+            self.color = self.color.swap('a', self.ids.a.value / float(self.ids.a.max), interned=True)
             self._updateDisplay()
 
     def _updateSliderValues(self):
@@ -202,10 +334,11 @@ class ColorPicker(QTemplateWidget):
         """
         if not self._updating:
             self._updating = True
+            values = {self.ids.a: round(self.color.a*100)}
             for id in self.mode:
                 slider = self.ids[f'{self.mode}_{id}']
-                slider.setValue(round(getattr(self.color, id)*slider.max))
-            self.ids.a.setValue(round(self.color.a*100))
+                values[slider] = round(getattr(self.color, id)*slider.max)
+            ColorSlider.setValues(values)
             self._updating = False
 
     def _updateDisplay(self):
@@ -213,17 +346,18 @@ class ColorPicker(QTemplateWidget):
         if not self._updating:
             self._updateSwatchDisplay()
             self._updateTextDisplay()
+            self._updateContrastDisplay()
             self._updateOpacityDisplay()
             if self.mode == RGB:
                 self._updateSliderDisplay('r')
                 self._updateSliderDisplay('g')
                 self._updateSliderDisplay('b')
             if self.mode == HSL:
-                self._updateHueDisplay()
+                self._updateSliderDisplay('h', 7)
                 self._updateSliderDisplay('s')
-                self._updateLightnessDisplay()
+                self._updateSliderDisplay('l', 3)
             if self.mode == HSV:
-                self._updateHueDisplay()
+                self._updateSliderDisplay('h', 7)
                 self._updateSliderDisplay('s')
                 self._updateSliderDisplay('v')
             if self.mode == CMYK:
@@ -231,6 +365,7 @@ class ColorPicker(QTemplateWidget):
                 self._updateSliderDisplay('m')
                 self._updateSliderDisplay('y')
                 self._updateSliderDisplay('k')
+            self.colorChanged.emit(self.color)
 
     def _updateSwatchDisplay(self):
         """ Update the swatch display. """
@@ -244,40 +379,35 @@ class ColorPicker(QTemplateWidget):
         if hasattr(self, 'settings'):
             self.settings.updateColorFormats(self.color)
 
-    def _updateSliderDisplay(self, id):
-        """ Update the slider id given current rgba or hsva selection. """
+    def _updateContrastDisplay(self):
+        """ Update the contrast ratio against self.contrastColor. Only the
+            current color's luminance is computed, the background is cached.
+        """
+        if self._contrastLum is None:
+            self.ids.contrast.setVisible(False)
+            return
+        ratio = contrastRatio(luminance(self.color.rgb), self._contrastLum)
+        level = 'AAA' if ratio >= AAA else 'AA' if ratio >= AA else 'AA Large' if ratio >= AA_LARGE else 'Fail'
+        self.ids.contrast.setText(f'{ratio:.2f} {level}')
+        self.ids.contrast.setToolTip(f'Contrast against {self.contrastColor.hex.upper()}')
+        self.ids.contrast.setVisible(True)
+
+    def _updateSliderDisplay(self, id, steps=2):
+        """ Update the slider id background gradient given the current color.
+            The gradient is interpolated in the slider's color space. Each
+            channel is piecewise linear in rgb, so a few stops are exact.
+        """
+        index = self.mode.index(id)
+        start, end = list(getattr(self.color, self.mode)), list(getattr(self.color, self.mode))
+        start[index], end[index] = 0, 1
+        rgba = interpolate([start+[1], end+[1]], steps, space=self.mode, hue=INCREASING)
+        stops = ', '.join(f'stop:{round(i/(steps-1.0), 2)} {color.hex}' for i, color in enumerate(toColors(rgba)))
         gradient = f"""#{self.mode}_{id} QSlider {{
-            background-color: qlineargradient(x1:0, x2:1,
-            stop:0 {self.color.swap(id, 0).hex},
-            stop:1 {self.color.swap(id, 1).hex});
+            background-color: qlineargradient(x1:0, x2:1, {stops});
         }}"""
         slider = self.ids[f'{self.mode}_{id}']
         slider.setStyleSheet(gradient)
 
-    def _updateHueDisplay(self):
-        """ Update the hue background gradient. """
-        gradient = f"""#{self.mode}_h QSlider {{
-          background-color: qlineargradient(x1:0, x2:1,
-            stop:0 {self.color.swap('h',0).hex},
-            stop:0.17 {self.color.swap('h',0.166).hex},
-            stop:0.33 {self.color.swap('h',0.333).hex},
-            stop:0.5 {self.color.swap('h',0.5).hex},
-            stop:0.67 {self.color.swap('h',0.666).hex},
-            stop:0.83 {self.color.swap('h',0.833).hex},
-            stop:1 {self.color.swap('h',1).hex});
-        }}"""
-        slider = self.ids[f'{self.mode}_h']
-        slider.setStyleSheet(gradient)
-    
-    def _updateLightnessDisplay(self):
-        gradient = f"""#hsl_l QSlider {{
-          background-color: qlineargradient(x1:0, x2:1,
-            stop:0 {self.color.swap('l',0).hex},
-            stop:0.5 {self.color.swap('l',0.5).hex},
-            stop:1 {self.color.swap('l',1).hex});
-        }}"""
-        self.ids.hsl_l.setStyleSheet(gradient)
-    
     def _updateOpacityDisplay(self):
         """ Update the opacity background gradient. """
         r,g,b = (round(x*255) for x in self.color.rgb)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from colorpecker.color import RgbColor
+from colorpecker.colorspace import OKLAB, SPACES
+
+# Hue interpolation methods (CSS Color 4)
+SHORTER = 'shorter'
+LONGER = 'longer'
+INCREASING = 'increasing'
+DECREASING = 'decreasing'
+
+# Easing curves mapping 0-1 to 0-1
+EASINGS = {
+    'linear': lambda t: t,
+    'easein': lambda t: t * t,
+    'easeout': lambda t: t * (2 - t),
+    'easeinout': lambda t: t * t * (3 - 2 * t),
+    'sine': lambda t: (1 - numpy.cos(t * numpy.pi)) / 2,
+}
+
+
+def colorScale(colors, steps, space=OKLAB, easing='linear', hue=SHORTER, positions=None):
+    """ Returns a (steps, 4) rgba array interpolated between two or more
+        colors in the specified color space. Colors can be RgbColors or
+        rgb(a) tuples on a 0-1 scale. Positions optionally sets where each
+        color sits on the 0-1 scale, they are spaced evenly by default.
+    """
+    rgba = numpy.array([c.rgba if isinstance(c, RgbColor) else tuple(c) + (1,)*(4-len(c)) for c in colors])
+    fromRgb, _, hueindex = SPACES[space]
+    stops = numpy.concatenate([fromRgb(rgba[:,:3]), rgba[:,3:]], axis=1)
+    if hueindex is not None:
+        # Hue is powerless for grays, use the hue of a neighbouring stop
+        chroma = rgba[:,:3].max(axis=1) - rgba[:,:3].min(axis=1)
+        for i in numpy.flatnonzero(chroma == 0):
+            colored = numpy.flatnonzero(chroma > 0)
+            if len(colored):
+                stops[i,hueindex] = stops[colored[numpy.abs(colored - i).argmin()], hueindex]
+    return interpolate(stops, steps, space, easing, hue, positions)
+
+
+def interpolate(stops, steps, space=OKLAB, easing='linear', hue=SHORTER, positions=None):
+    """ Returns a (steps, 4) rgba array interpolated between stops, which
+        are given as coordinates in the specified color space with alpha as
+        the last channel. Every step is computed in a single vectorized pass.
+    """
+    stops = numpy.asarray(stops, dtype=numpy.float64)
+    _, toRgb, hueindex = SPACES[space]
+    if positions is None:
+        positions = numpy.linspace(0, 1, len(stops))
+    positions = numpy.asarray(positions, dtype=numpy.float64)
+    if positions.shape != (len(stops),):
+        raise Exception(f'Expected {len(stops)} positions, got {positions.size}')
+    if numpy.any(numpy.diff(positions) < 0):
+        raise Exception('Positions must be in increasing order')
+    t = EASINGS[easing](numpy.linspace(0, 1, steps))
+    segment = numpy.clip(numpy.searchsorted(positions, t, side='right') - 1, 0, len(stops) - 2)
+    start, end = stops[segment], stops[segment+1]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        u = (t - positions[segment]) / (positions[segment+1] - positions[segment])
+    # Clamp so steps outside the first and last positions hold those colors
+    # and equal positions make a hard stop
+    u = numpy.clip(numpy.nan_to_num(u), 0, 1)[:,None]
+    delta = end - start
+    if hueindex is not None:
+        delta[:,hueindex] = _hueDelta(start[:,hueindex], end[:,hueindex], hue)
+    values = start + u * delta
+    if hueindex is not None:
+        values[:,hueindex] %= 1.0
+    rgb = numpy.clip(toRgb(values[:,:-1]), 0, 1)
+    return numpy.concatenate([rgb, numpy.clip(values[:,-1:], 0, 1)], axis=1)
+
+
+def toColors(rgba):
+    """ Returns a list of RgbColors from a (n, 4) rgba array. """
+    return [RgbColor(*(float(x) for x in row), scale=1) for row in rgba]
+
+
+def formatScale(rgba, cformat):
+    """ Returns a list of strings formatted with one of color.COLORFORMATS. """
+    return [color.format(cformat) for color in toColors(rgba)]
+
+
+def _hueDelta(start, end, method):
+    """ Returns the 0-1 hue difference to travel for the hue method. """
+    delta = end - start
+    if method == SHORTER:
+        return (delta + 0.5) % 1.0 - 0.5
+    if method == LONGER:
+        shorter = (delta + 0.5) % 1.0 - 0.5
+        return numpy.where(shorter > 0, shorter - 1, numpy.where(shorter < 0, shorter + 1, delta))
+    if method == INCREASING:
+        return numpy.where(delta < 0, delta + 1, delta)
+    if method == DECREASING:
+        return numpy.where(delta > 0, delta - 1, delta)
+    raise Exception(f'Unknown hue interpolation method: {method}')
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from colorpecker import log  # noqa
+from contextlib import contextmanager, ExitStack
 from qtemplate import QTemplateWidget
-from PySide6.QtCore import Signal
+from PySide6.QtCore import QSignalBlocker, Signal
 
 
 class ColorSlider(QTemplateWidget):
@@ -24,6 +25,8 @@ class ColorSlider(QTemplateWidget):
     def __init__(self, *args, **kwargs):
         super(ColorSlider, self).__init__(*args, **kwargs)
         self._value = None      # Internval value with scale applied
+        self._blocked = 0       # Depth of nested blockUpdates()
+        self._pending = False   # Value changed while updates blocked
     
     @property
     def min(self):
@@ -43,8 +46,43 @@ class ColorSlider(QTemplateWidget):
         self.ids.spinbox.setRange(minValue, maxValue)
 
     def setValue(self, value):
+        """ Set the value, updating the slider and spinbox with their signals
+            blocked so valueChanged is emitted exactly once per change.
+        """
         if value != self._value:
             self._value = value
-            self.ids.slider.setValue(value)
-            self.ids.spinbox.setValue(value)
-            self.valueChanged.emit(value)
+            with QSignalBlocker(self.ids.slider), QSignalBlocker(self.ids.spinbox):
+                self.ids.slider.setValue(value)
+                self.ids.spinbox.setValue(value)
+            if self._blocked:
+                self._pending = True
+            else:
+                self.valueChanged.emit(value)
+
+    @contextmanager
+    def blockUpdates(self, emit=True):
+        """ Batch value changes made inside the block. When the outermost block
+            exits valueChanged is emitted once with the final value if it
+            changed, or not at all if emit is False.
+        """
+        self._blocked += 1
+        try:
+            yield self
+        finally:
+            self._blocked -= 1
+            if not self._blocked and self._pending:
+                self._pending = False
+                if emit: self.valueChanged.emit(self._value)
+
+    @staticmethod
+    def setValues(values, emit=False):
+        """ Set the values of several sliders from a {slider: value} dict as
+            one batch. By default no valueChanged signals are emitted, which
+            is what we want when the values are derived from a color change
+            that was already handled.
+        """
+        with ExitStack() as stack:
+            for slider in values:
+                stack.enter_context(slider.blockUpdates(emit))
+            for slider, value in values.items():
+                slider.setValue(value)
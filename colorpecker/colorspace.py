@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from functools import lru_cache, partial
+
+# Color space names and matrices
+SRGB = 'rgb'
+LINEAR = 'linear'
+LAB = 'lab'
+OKLAB = 'oklab'
+OKLCH = 'oklch'
+DISPLAYP3 = 'display-p3'
+REC2020 = 'rec2020'
+LAB_E, LAB_K = 216/24389.0, 24389/27.0
+SRGB2XYZ = numpy.array([
+    [0.41239079926595950, 0.35758433938387796, 0.18048078840183430],
+    [0.21263900587151036, 0.71516867876775590, 0.07219231536073371],
+    [0.01933081871559185, 0.11919477979462599, 0.95053215224966060]])
+XYZ2SRGB = numpy.linalg.inv(SRGB2XYZ)
+D65 = SRGB2XYZ.sum(axis=1)
+OKLAB_M1 = numpy.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005]])
+OKLAB_M2 = numpy.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660]])
+OKLAB_M1_INV = numpy.linalg.inv(OKLAB_M1)
+OKLAB_M2_INV = numpy.linalg.inv(OKLAB_M2)
+P32XYZ = numpy.array([
+    [0.48657094864821620, 0.26566769316909306, 0.19821728523436250],
+    [0.22897456406974880, 0.69173852183650640, 0.07928691409374500],
+    [0.00000000000000000, 0.04511338185890264, 1.04394436890097600]])
+REC20202XYZ = numpy.array([
+    [0.63695804830129140, 0.14461690358620832, 0.16888097516417210],
+    [0.26270021201126710, 0.67799807151887080, 0.05930171646986196],
+    [0.00000000000000000, 0.02807269304908743, 1.06098505771079100]])
+REC2020_A, REC2020_B = 1.09929682680944, 0.018053968510807
+
+# Gamut mapping (CSS Color 4): chroma is reduced in OKLCH until clipping
+# the color changes it by less than JND, searched to within GAMUT_EPSILON.
+GAMUT_JND = 0.02
+GAMUT_EPSILON = 0.0001
+
+# Vectorized color space transforms. Every function accepts an array-like
+# with the channels on the last axis and returns a float64 numpy array.
+# sRGB, hsl, hsv and cmyk values are on a 0-1 scale like RgbColor.
+
+
+def srgb2linear(rgb):
+    """ Convert gamma encoded sRGB values to linear light. Values outside
+        0-1 are extended by mirroring the curve, as CSS Color 4 does.
+    """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    absrgb = numpy.abs(rgb)
+    return numpy.sign(rgb) * numpy.where(absrgb <= 0.04045, absrgb / 12.92, ((absrgb + 0.055) / 1.055) ** 2.4)
+
+
+def linear2srgb(rgb):
+    """ Convert linear light values to gamma encoded sRGB. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    absrgb = numpy.abs(rgb)
+    return numpy.sign(rgb) * numpy.where(absrgb <= 0.0031308, absrgb * 12.92, 1.055 * absrgb ** (1/2.4) - 0.055)
+
+
+def rgb2hsl(rgb):
+    """ Convert sRGB values to (h,s,l). Matches RgbColor.hsl. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    maxc, minc = rgb.max(axis=-1), rgb.min(axis=-1)
+    delta = maxc - minc
+    l = (maxc + minc) / 2.0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        s = numpy.where(l <= 0.5, delta / (maxc + minc), delta / (2.0 - maxc - minc))
+    s = numpy.where(delta == 0, 0.0, s)
+    return numpy.stack([_hue(rgb, maxc, delta), s, l], axis=-1)
+
+
+def hsl2rgb(hsl):
+    """ Convert (h,s,l) values to sRGB. """
+    hsl = numpy.asarray(hsl, dtype=numpy.float64)
+    h, s, l = hsl[...,0,None], hsl[...,1,None], hsl[...,2,None]
+    k = (numpy.array([0, 8, 4]) + h*12) % 12
+    a = s * numpy.minimum(l, 1-l)
+    return l - a * numpy.clip(numpy.minimum(k-3, 9-k), -1, 1)
+
+
+def rgb2hsv(rgb):
+    """ Convert sRGB values to (h,s,v). Matches RgbColor.hsv. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    maxc, minc = rgb.max(axis=-1), rgb.min(axis=-1)
+    delta = maxc - minc
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        s = numpy.where(maxc == 0, 0.0, delta / maxc)
+    return numpy.stack([_hue(rgb, maxc, delta), s, maxc], axis=-1)
+
+
+def hsv2rgb(hsv):
+    """ Convert (h,s,v) values to sRGB. """
+    hsv = numpy.asarray(hsv, dtype=numpy.float64)
+    h, s, v = hsv[...,0,None], hsv[...,1,None], hsv[...,2,None]
+    k = (numpy.array([5, 3, 1]) + h*6) % 6
+    return v - v * s * numpy.clip(numpy.minimum(k, 4-k), 0, 1)
+
+
+def rgb2cmyk(rgb):
+    """ Convert sRGB values to (c,m,y,k). Matches RgbColor.cmyk. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    k = 1 - rgb.max(axis=-1)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        cmy = (1 - rgb - k[...,None]) / (1 - k[...,None])
+    cmy = numpy.where(k[...,None] == 1, 0.0, cmy)
+    return numpy.concatenate([cmy, k[...,None]], axis=-1)
+
+
+def cmyk2rgb(cmyk):
+    """ Convert (c,m,y,k) values to sRGB. """
+    cmyk = numpy.asarray(cmyk, dtype=numpy.float64)
+    return (1 - cmyk[...,:3]) * (1 - cmyk[...,3,None])
+
+
+def _hue(rgb, maxc, delta):
+    """ Returns the 0-1 hue shared by hsl and hsv, 0 when achromatic. """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        rc, gc, bc = numpy.moveaxis((maxc[...,None] - rgb) / delta[...,None], -1, 0)
+    r, g = rgb[...,0], rgb[...,1]
+    h = numpy.where(r == maxc, bc - gc, numpy.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    return numpy.where(delta == 0, 0.0, (h / 6.0) % 1.0)
+
+
+def linear2xyz(rgb):
+    """ Convert linear sRGB to CIE XYZ (D65). """
+    return numpy.asarray(rgb, dtype=numpy.float64) @ SRGB2XYZ.T
+
+
+def xyz2linear(xyz):
+    """ Convert CIE XYZ (D65) to linear sRGB. """
+    return numpy.asarray(xyz, dtype=numpy.float64) @ XYZ2SRGB.T
+
+
+def rgb2lab(rgb):
+    """ Convert sRGB values to CIE L*a*b* (D65), L is on a 0-100 scale. """
+    xyz = linear2xyz(srgb2linear(rgb)) / D65
+    f = numpy.where(xyz > LAB_E, numpy.cbrt(xyz), (LAB_K * xyz + 16) / 116.0)
+    return numpy.stack([116*f[...,1] - 16, 500*(f[...,0] - f[...,1]), 200*(f[...,1] - f[...,2])], axis=-1)
+
+
+def lab2rgb(lab):
+    """ Convert CIE L*a*b* (D65) values to sRGB. """
+    lab = numpy.asarray(lab, dtype=numpy.float64)
+    fy = (lab[...,0] + 16) / 116.0
+    f = numpy.stack([fy + lab[...,1]/500.0, fy, fy - lab[...,2]/200.0], axis=-1)
+    xyz = numpy.where(f**3 > LAB_E, f**3, (116*f - 16) / LAB_K)
+    return linear2srgb(xyz2linear(xyz * D65))
+
+
+def rgb2oklab(rgb):
+    """ Convert sRGB values to OKLab. """
+    lms = numpy.cbrt(srgb2linear(rgb) @ OKLAB_M1.T)
+    return lms @ OKLAB_M2.T
+
+
+def oklab2rgb(lab):
+    """ Convert OKLab values to sRGB. """
+    lms = (numpy.asarray(lab, dtype=numpy.float64) @ OKLAB_M2_INV.T) ** 3
+    return linear2srgb(lms @ OKLAB_M1_INV.T)
+
+
+def oklab2oklch(lab):
+    """ Convert OKLab values to OKLCH, h is on a 0-1 scale like hsl. """
+    lab = numpy.asarray(lab, dtype=numpy.float64)
+    c = numpy.hypot(lab[...,1], lab[...,2])
+    h = (numpy.arctan2(lab[...,2], lab[...,1]) / (2*numpy.pi)) % 1.0
+    return numpy.stack([lab[...,0], c, h], axis=-1)
+
+
+def oklch2oklab(lch):
+    """ Convert OKLCH values to OKLab. """
+    lch = numpy.asarray(lch, dtype=numpy.float64)
+    h = lch[...,2] * 2*numpy.pi
+    return numpy.stack([lch[...,0], lch[...,1]*numpy.cos(h), lch[...,1]*numpy.sin(h)], axis=-1)
+
+
+def rgb2oklch(rgb):
+    """ Convert sRGB values to OKLCH. """
+    return oklab2oklch(rgb2oklab(rgb))
+
+
+def oklch2rgb(lch):
+    """ Convert OKLCH values to sRGB. """
+    return oklab2rgb(oklch2oklab(lch))
+
+
+def rec20202linear(rgb):
+    """ Convert gamma encoded Rec.2020 values to linear light. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    absrgb = numpy.abs(rgb)
+    linear = numpy.where(absrgb < REC2020_B*4.5, absrgb / 4.5, ((absrgb + REC2020_A - 1) / REC2020_A) ** (1/0.45))
+    return numpy.sign(rgb) * linear
+
+
+def linear2rec2020(rgb):
+    """ Convert linear light values to gamma encoded Rec.2020. """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    absrgb = numpy.abs(rgb)
+    encoded = numpy.where(absrgb < REC2020_B, absrgb * 4.5, REC2020_A * absrgb ** 0.45 - (REC2020_A - 1))
+    return numpy.sign(rgb) * encoded
+
+
+def convertRgb(rgb, source, target):
+    """ Convert gamma encoded rgb values between the RGB color spaces in
+        GAMUTS. Values outside the target gamut are returned out of the
+        0-1 range rather than clipped, see inGamut() and gamutMap().
+    """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)
+    if source == target:
+        return rgb.copy()
+    linear = GAMUTS[source][1](rgb)
+    if GAMUTS[source][0] is not GAMUTS[target][0]:
+        linear = linear @ _gamutMatrix(source, target).T
+    return GAMUTS[target][2](linear)
+
+
+def inGamut(rgb, epsilon=1e-6):
+    """ Returns True where encoded rgb values are inside their gamut, the
+        channels are reduced on the last axis. To check if a color fits in
+        another gamut convert it first: inGamut(convertRgb(p3, DISPLAYP3, SRGB))
+    """
+    rgb = numpy.asarray(rgb, dtype=numpy.float64)[...,:3]
+    return ((rgb >= -epsilon) & (rgb <= 1 + epsilon)).all(axis=-1)
+
+
+def gamutMap(rgb, source=SRGB, target=SRGB):
+    """ Returns encoded rgb values in source mapped into the target gamut
+        using the CSS Color 4 algorithm. Out of gamut colors keep their
+        OKLCH lightness and hue while chroma is reduced by binary search,
+        each step running over every unresolved color at once. Colors in
+        gamut are converted unchanged, alpha on the last axis is kept.
+    """
+    values = numpy.asarray(rgb, dtype=numpy.float64)
+    shape = values.shape
+    values = values.reshape(-1, shape[-1])
+    result = numpy.array(values)
+    mapped = convertRgb(values[:,:3], source, target)
+    result[:,:3] = mapped
+    todo = numpy.flatnonzero(~inGamut(mapped, 0))
+    if len(todo):
+        lch = oklab2oklch(_linear2oklab(convertRgb(values[todo,:3], source, LINEAR)))
+        result[todo,:3] = _chromaReduce(lch, target)
+    return result.reshape(shape)
+
+
+def _chromaReduce(lch, target):
+    """ Returns OKLCH colors mapped into the target gamut as encoded rgb.
+        Follows the CSS Color 4 binary search, vectorized with one active
+        index per unresolved color.
+    """
+    l, c, h = lch[:,0], lch[:,1], lch[:,2]
+    result = numpy.zeros((len(lch), 3))
+    result[l >= 1] = 1
+    active = numpy.flatnonzero((l > 0) & (l < 1))
+    # Colors whose clipped version is already close enough are done
+    clipped, error = _clipError(lch[active], target)
+    done = error < GAMUT_JND
+    result[active[done]] = clipped[done]
+    active, best = active[~done], clipped[~done]
+    lo, hi = numpy.zeros(len(active)), c[active].copy()
+    loInGamut = numpy.ones(len(active), dtype=bool)
+    while len(active):
+        chroma = (lo + hi) / 2
+        current = numpy.stack([l[active], chroma, h[active]], axis=-1)
+        rgb = convertRgb(_oklch2linear(current), LINEAR, target)
+        ingamut = loInGamut & inGamut(rgb, 0)
+        clipped, error = _clipError(current, target, rgb)
+        close = ~ingamut & (error < GAMUT_JND)
+        finished = close & (GAMUT_JND - error < GAMUT_EPSILON)
+        best = numpy.where(ingamut[:,None], best, clipped)
+        lo = numpy.where(ingamut | close, chroma, lo)
+        hi = numpy.where(ingamut | close, hi, chroma)
+        loInGamut &= ~close
+        finished |= (hi - lo) <= GAMUT_EPSILON
+        result[active[finished]] = best[finished]
+        keep = ~finished
+        active, best, lo, hi, loInGamut = active[keep], best[keep], lo[keep], hi[keep], loInGamut[keep]
+    return result
+
+
+def _clipError(lch, target, rgb=None):
+    """ Returns the clipped target rgb of OKLCH colors and the deltaEOK
+        between each color and its clipped version.
+    """
+    if rgb is None:
+        rgb = convertRgb(_oklch2linear(lch), LINEAR, target)
+    clipped = numpy.clip(rgb, 0, 1)
+    lab = _linear2oklab(convertRgb(clipped, target, LINEAR))
+    return clipped, numpy.linalg.norm(lab - oklch2oklab(lch), axis=-1)
+
+
+def _linear2oklab(linear):
+    """ Convert linear sRGB values to OKLab, out of range values allowed. """
+    return numpy.cbrt(linear @ OKLAB_M1.T) @ OKLAB_M2.T
+
+
+def _oklch2linear(lch):
+    """ Convert OKLCH values to linear sRGB, out of range values allowed. """
+    return ((oklch2oklab(lch) @ OKLAB_M2_INV.T) ** 3) @ OKLAB_M1_INV.T
+
+
+@lru_cache(maxsize=None)
+def _gamutMatrix(source, target):
+    """ Returns the matrix converting linear source rgb to linear target. """
+    return numpy.linalg.inv(GAMUTS[target][0]) @ GAMUTS[source][0]
+
+
+def _identity(values):
+    return numpy.asarray(values, dtype=numpy.float64)
+
+
+# RGB space name: (to XYZ matrix, to linear, from linear)
+GAMUTS = {
+    SRGB: (SRGB2XYZ, srgb2linear, linear2srgb),
+    LINEAR: (SRGB2XYZ, _identity, _identity),
+    DISPLAYP3: (P32XYZ, srgb2linear, linear2srgb),
+    REC2020: (REC20202XYZ, rec20202linear, linear2rec2020),
+}
+
+
+# Space name: (fromRgb, toRgb, hue channel index or None)
+SPACES = {
+    SRGB: (_identity, _identity, None),
+    LINEAR: (srgb2linear, linear2srgb, None),
+    'hsl': (rgb2hsl, hsl2rgb, 0),
+    'hsv': (rgb2hsv, hsv2rgb, 0),
+    'cmyk': (rgb2cmyk, cmyk2rgb, None),
+    LAB: (rgb2lab, lab2rgb, None),
+    OKLAB: (rgb2oklab, oklab2rgb, None),
+    OKLCH: (rgb2oklch, oklch2rgb, 2),
+    DISPLAYP3: (partial(convertRgb, source=SRGB, target=DISPLAYP3),
+        partial(convertRgb, source=DISPLAYP3, target=SRGB), None),
+    REC2020: (partial(convertRgb, source=SRGB, target=REC2020),
+        partial(convertRgb, source=REC2020, target=SRGB), None),
+}
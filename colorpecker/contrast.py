@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from colorpecker.colorspace import linear2srgb, srgb2linear
+
+# WCAG 2 minimum contrast ratios
+AA = 4.5
+AA_LARGE = 3.0
+AAA = 7.0
+AAA_LARGE = 4.5
+
+# Relative luminance coefficients of linear sRGB
+LUMINANCE = numpy.array([0.2126, 0.7152, 0.0722])
+
+
+def luminance(rgb):
+    """ Returns the WCAG relative luminance of rgb values on a 0-1 scale.
+        Accepts a single (r,g,b) or an array of them on the last axis.
+    """
+    return srgb2linear(numpy.asarray(rgb)[...,:3]) @ LUMINANCE
+
+
+def contrastRatio(lum1, lum2):
+    """ Returns the contrast ratio between two relative luminances. Works
+        element-wise on arrays, the order of the arguments does not matter.
+    """
+    lighter, darker = numpy.maximum(lum1, lum2), numpy.minimum(lum1, lum2)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def contrastMatrix(foregrounds, backgrounds, dtype=numpy.float32):
+    """ Returns the (len(foregrounds), len(backgrounds)) matrix of contrast
+        ratios. A 2000 color palette against itself is 4M ratios, which is
+        computed in a single broadcast rather than pair by pair.
+    """
+    fglum = luminance(foregrounds).astype(dtype)
+    bglum = luminance(backgrounds).astype(dtype)
+    return contrastRatio(fglum[:,None], bglum[None,:])
+
+
+def passMasks(matrix, large=False):
+    """ Returns the (aa, aaa) boolean pass masks of a contrast matrix. Set
+        large to use the thresholds for large text.
+    """
+    if large:
+        return matrix >= AA_LARGE, matrix >= AAA_LARGE
+    return matrix >= AA, matrix >= AAA
+
+
+def nearestCompliant(foregrounds, backgrounds, ratio=AA):
+    """ Returns the foreground colors adjusted as little as possible to reach
+        ratio against the backgrounds. Foregrounds are darkened or lightened
+        in linear light, keeping their hue, in whichever direction needs the
+        smaller change. Arrays broadcast, so passing fg[None,:] and bg[:,None]
+        returns the compliant version of every foreground for each background.
+        Colors that already pass are returned unchanged.
+    """
+    foregrounds = numpy.asarray(foregrounds, dtype=numpy.float64)[...,:3]
+    linear = srgb2linear(foregrounds)
+    fglum = linear @ LUMINANCE
+    bglum = luminance(backgrounds)
+    fglum, bglum = numpy.broadcast_arrays(fglum, bglum)
+    # Target luminance when darkening or lightening the foreground, nudged
+    # so floating point error can't leave the result just under ratio
+    target = ratio + 1e-6
+    dark = (bglum + 0.05) / target - 0.05
+    light = target * (bglum + 0.05) - 0.05
+    candark, canlight = dark >= 0, light <= 1
+    darken = candark & (~canlight | (numpy.abs(fglum - dark) <= numpy.abs(light - fglum)))
+    # Scale toward black: lum*t == dark; Scale toward white: lum+t(1-lum) == light
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        tdark = numpy.clip(numpy.where(fglum > 0, dark / fglum, 0), 0, 1)
+        tlight = numpy.clip(numpy.where(fglum < 1, (light - fglum) / (1 - fglum), 0), 0, 1)
+    linear = numpy.broadcast_to(linear, fglum.shape + (3,))
+    darker = linear * tdark[...,None]
+    lighter = linear + (1 - linear) * tlight[...,None]
+    adjusted = linear2srgb(numpy.where(darken[...,None], darker, lighter))
+    passing = (contrastRatio(fglum, bglum) >= ratio)[...,None]
+    return numpy.where(passing, numpy.broadcast_to(foregrounds, adjusted.shape), adjusted)
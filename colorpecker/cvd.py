@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from colorpecker.colorscale import toColors
+from colorpecker.colorspace import linear2srgb, srgb2linear
+from colorpecker.utils import array2qimage, qimage2array
+
+# Color vision deficiencies
+PROTANOPIA = 'protanopia'
+DEUTERANOPIA = 'deuteranopia'
+TRITANOPIA = 'tritanopia'
+ACHROMATOPSIA = 'achromatopsia'
+
+# Simulation matrices applied to linear rgb. Dichromacies use Machado et
+# al. (2009) at full severity, achromatopsia maps everything to luminance.
+MATRICES = {
+    PROTANOPIA: numpy.array([
+        [0.152286, 1.052583, -0.204868],
+        [0.114503, 0.786281, 0.099216],
+        [-0.003882, -0.048116, 1.051998]]),
+    DEUTERANOPIA: numpy.array([
+        [0.367322, 0.860646, -0.227968],
+        [0.280085, 0.672501, 0.047413],
+        [-0.011820, 0.042940, 0.968881]]),
+    TRITANOPIA: numpy.array([
+        [1.255528, -0.076749, -0.178779],
+        [-0.078411, 0.930809, 0.147602],
+        [0.004733, 0.691367, 0.303900]]),
+    ACHROMATOPSIA: numpy.array([[0.2126, 0.7152, 0.0722]] * 3),
+}
+
+# Lookup tables for the uint8 path: 8-bit sRGB to linear and 12-bit linear
+# back to 8-bit sRGB. This keeps a frame to one table lookup, one matrix
+# multiply and one more table lookup.
+TOLINEAR = srgb2linear(numpy.arange(256) / 255.0).astype(numpy.float32)
+TOSRGB = numpy.round(linear2srgb(numpy.linspace(0, 1, 4096)) * 255).astype(numpy.uint8)
+
+
+def simulate(rgb, cvd):
+    """ Returns rgb(a) values on a 0-1 scale as seen with the color vision
+        deficiency. Accepts any array with the channels on the last axis,
+        alpha is passed through untouched.
+    """
+    rgb = numpy.array(rgb, dtype=numpy.float64)
+    linear = srgb2linear(rgb[...,:3]) @ MATRICES[cvd].T
+    rgb[...,:3] = linear2srgb(numpy.clip(linear, 0, 1))
+    return rgb
+
+
+def simulatePixels(pixels, cvd):
+    """ Returns a copy of (..., 4) uint8 RGBA pixels as seen with the color
+        vision deficiency.
+    """
+    result = numpy.array(pixels, dtype=numpy.uint8)
+    linear = TOLINEAR[result[...,:3]] @ MATRICES[cvd].T.astype(numpy.float32)
+    result[...,:3] = TOSRGB[(numpy.clip(linear, 0, 1) * 4095 + 0.5).astype(numpy.int32)]
+    return result
+
+
+def simulateImage(image, cvd):
+    """ Returns a copy of a QImage or image filepath as seen with the color
+        vision deficiency.
+    """
+    return array2qimage(simulatePixels(qimage2array(image), cvd))
+
+
+def simulateColors(colors, cvd):
+    """ Returns a list of RgbColors as seen with the color vision deficiency. """
+    if not colors:
+        return []
+    return toColors(simulate([color.rgba for color in colors], cvd))
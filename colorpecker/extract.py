@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from colorpecker.color import RgbColor
+from colorpecker.utils import qimage2array
+from collections import namedtuple
+
+# Extraction methods
+MEDIANCUT = 'mediancut'
+KMEANS = 'kmeans'
+
+# Pixels are bucketed into a 5-bit per channel histogram before
+# extraction, the rest of the work is done on the (at most 32k) bins.
+BITS = 5
+SHIFT = 8 - BITS
+
+PaletteColor = namedtuple('PaletteColor', 'color,share')
+
+
+def extractPalette(pixels, count=8, method=MEDIANCUT, maxsamples=250000, iterations=10):
+    """ Returns the top count colors of the pixels as a list of PaletteColor
+        sorted by their share of pixels. Pixels is any array that reshapes to
+        (n, 3) rgb or (n, 4) rgba uint8 values, fully transparent pixels are
+        ignored. When there are more than maxsamples pixels they are evenly
+        downsampled first, which keeps large regions well under 100ms.
+    """
+    pixels = numpy.asarray(pixels, dtype=numpy.uint8)
+    pixels = pixels.reshape(-1, pixels.shape[-1])
+    if maxsamples and len(pixels) > maxsamples:
+        pixels = pixels[::-(-len(pixels) // maxsamples)]
+    if pixels.shape[1] == 4:
+        pixels = pixels[pixels[:,3] > 0]
+    if not len(pixels):
+        return []
+    colors, weights = _histogram(pixels[:,:3])
+    centers, shares = _medianCut(colors, weights, count)
+    if method == KMEANS:
+        centers, shares = _kmeans(colors, weights, centers, iterations)
+    elif method != MEDIANCUT:
+        raise Exception(f'Unknown extraction method: {method}')
+    order = numpy.argsort(-shares)
+    return [PaletteColor(RgbColor(*(float(x)/255.0 for x in centers[i]), scale=1), round(float(shares[i]), 4))
+        for i in order if shares[i] > 0]
+
+
+def extractFromImage(image, count=8, **kwargs):
+    """ Returns the top count colors of a QImage or image filepath. See
+        extractPalette() for the available keyword arguments.
+    """
+    return extractPalette(qimage2array(image), count, **kwargs)
+
+
+def _histogram(pixels):
+    """ Bucket pixels into the BITS histogram. Returns the mean rgb color and
+        pixel count of each non-empty bin.
+    """
+    quantized = (pixels >> SHIFT).astype(numpy.int32)
+    bins = (quantized[:,0] << (BITS*2)) | (quantized[:,1] << BITS) | quantized[:,2]
+    size = 1 << (BITS*3)
+    weights = numpy.bincount(bins, minlength=size)
+    sums = numpy.stack([numpy.bincount(bins, pixels[:,i], minlength=size) for i in range(3)], axis=1)
+    used = weights > 0
+    return sums[used] / weights[used,None], weights[used].astype(numpy.float64)
+
+
+def _medianCut(colors, weights, count):
+    """ Repeatedly split the box with the largest weighted range at the
+        weighted median of its widest channel until we have count boxes.
+    """
+    boxes = [numpy.arange(len(colors))]
+    scores = [_boxScore(colors, weights, boxes[0])]
+    while len(boxes) < count:
+        index = max(range(len(boxes)), key=lambda i: scores[i][0])
+        score, channel = scores[index]
+        if score <= 0:
+            break
+        box = boxes.pop(index)
+        scores.pop(index)
+        box = box[numpy.argsort(colors[box,channel], kind='stable')]
+        cumsum = numpy.cumsum(weights[box])
+        split = min(max(int(numpy.searchsorted(cumsum, cumsum[-1] / 2.0)), 1), len(box)-1)
+        boxes += [box[:split], box[split:]]
+        scores += [_boxScore(colors, weights, box[:split]), _boxScore(colors, weights, box[split:])]
+    centers = numpy.array([numpy.average(colors[box], axis=0, weights=weights[box]) for box in boxes])
+    shares = numpy.array([weights[box].sum() for box in boxes]) / weights.sum()
+    return centers, shares
+
+
+def _boxScore(colors, weights, box):
+    """ Returns (score, channel) for the median cut box. The score is the
+        widest channel range multiplied by the number of pixels in the box.
+    """
+    if len(box) < 2:
+        return 0, 0
+    span = colors[box].max(axis=0) - colors[box].min(axis=0)
+    return span.max() * weights[box].sum(), int(span.argmax())
+
+
+def _kmeans(colors, weights, centers, iterations):
+    """ Weighted k-means over the histogram bins, seeded with the median cut
+        centers. Each iteration is a single vectorized assignment step.
+    """
+    for _ in range(iterations):
+        labels = _nearest(colors, centers)
+        totals = numpy.bincount(labels, weights, minlength=len(centers))
+        sums = numpy.stack([numpy.bincount(labels, weights*colors[:,i], minlength=len(centers)) for i in range(3)], axis=1)
+        used = totals > 0
+        moved = centers.copy()
+        moved[used] = sums[used] / totals[used,None]
+        converged = numpy.abs(moved - centers).max() < 0.5
+        centers = moved
+        if converged:
+            break
+    totals = numpy.bincount(_nearest(colors, centers), weights, minlength=len(centers))
+    return centers, totals / weights.sum()
+
+
+def _nearest(colors, centers):
+    """ Returns the index of the nearest center for each color. Expands
+        |x-c|^2 to |c|^2 - 2x.c since |x|^2 does not change the argmin.
+    """
+    distances = (centers ** 2).sum(axis=1)[None,:] - 2 * (colors @ centers.T)
+    return distances.argmin(axis=1)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import heapq
+import numpy
+import os
+import time
+from colorpecker import STORAGEDIR, log
+from colorpecker.colorbuffer import pack, unpack
+from os.path import dirname, exists, getsize, normpath
+
+# History file layout: a header of MAGIC, capacity and the total number of
+# colors ever added, followed by a ring of capacity packed records.
+MAGIC = b'CPHIST01'
+HEADER = numpy.dtype([('magic', 'S8'), ('capacity', '<u8'), ('total', '<u8')])
+RECORD = numpy.dtype([('rgba', '>u4'), ('time', '<u4')])
+CAPACITY = 1 << 20
+FILEPATH = f'{STORAGEDIR}/ColorPecker/history.bin'
+
+# Histories shared in this process {filepath: History}
+_SHARED = {}
+
+
+class History:
+    """ Persistent color history stored as a memory-mapped ring buffer.
+        Adding a color writes one 8 byte record and bumps the total in the
+        header, the file is never rewritten. Recent colors are read straight
+        from the ring, frequency and recency queries use an index that is
+        built on first use and kept up to date as colors are added. The
+        index is rebuilt if another History on the same file added colors
+        since, use sharedHistory() to avoid that within a process.
+    """
+
+    def __init__(self, filepath=None, capacity=CAPACITY):
+        self.filepath = filepath or FILEPATH
+        self.capacity = capacity        # Max records kept in the ring
+        self._header = None             # Memory-mapped header record
+        self._records = None            # Memory-mapped ring of records
+        self._counts = None             # Index of {rgba: count}
+        self._lastseen = None           # Index of {rgba: time}
+        self._indexed = 0               # Total when the index was last current
+        self._open()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def total(self):
+        """ Total number of colors ever added. """
+        return int(self._header['total'])
+
+    def add(self, color, timestamp=None):
+        """ Add an RgbColor to the history. """
+        value, timestamp = pack(color), int(timestamp or time.time())
+        index = self.total % self.capacity
+        if self._counts is not None and self._indexed == self.total:
+            if self.total >= self.capacity:
+                self._forget(int(self._records[index]['rgba']))
+            self._counts[value] = self._counts.get(value, 0) + 1
+            self._lastseen[value] = timestamp
+            self._indexed += 1
+        self._records[index] = (value, timestamp)
+        self._header['total'] = self.total + 1
+
+    def recent(self, count=10, unique=True):
+        """ Returns up to count of the most recently added RgbColors, newest
+            first. Only the tail of the ring is read, no index is needed.
+        """
+        colors, seen = [], set()
+        for value in self._newest():
+            if unique and value in seen:
+                continue
+            seen.add(value)
+            colors.append(unpack(value))
+            if len(colors) >= count:
+                break
+        return colors
+
+    def frequent(self, count=10):
+        """ Returns up to count of the most frequently added RgbColors. """
+        self._buildIndex()
+        values = heapq.nlargest(count, self._counts, key=lambda v: (self._counts[v], self._lastseen[v]))
+        return [unpack(value) for value in values]
+
+    def frequency(self, color):
+        """ Returns how many times color is in the history. """
+        self._buildIndex()
+        return self._counts.get(pack(color), 0)
+
+    def lastSeen(self, color):
+        """ Returns the unix time color was last added or None. """
+        self._buildIndex()
+        return self._lastseen.get(pack(color))
+
+    def flush(self):
+        """ Flush changes to disk, the OS will also do this on its own. """
+        self._header.flush()
+        self._records.flush()
+
+    def _open(self):
+        """ Open the history file, creating it if it doesn't exist or was
+            created with a different capacity.
+        """
+        size = HEADER.itemsize + RECORD.itemsize*self.capacity
+        if exists(self.filepath) and getsize(self.filepath) == size:
+            header = numpy.fromfile(self.filepath, dtype=HEADER, count=1)[0]
+            if header['magic'] != MAGIC or header['capacity'] != self.capacity:
+                log.warning(f'Recreating color history {normpath(self.filepath)}')
+                os.remove(self.filepath)
+        elif exists(self.filepath):
+            log.warning(f'Recreating color history {normpath(self.filepath)}')
+            os.remove(self.filepath)
+        if not exists(self.filepath):
+            os.makedirs(dirname(self.filepath), exist_ok=True)
+            with open(self.filepath, 'wb') as handle:
+                handle.write(numpy.array((MAGIC, self.capacity, 0), dtype=HEADER).tobytes())
+                handle.truncate(size)
+        self._header = numpy.memmap(self.filepath, dtype=HEADER, mode='r+', shape=())
+        self._records = numpy.memmap(self.filepath, dtype=RECORD, mode='r+', offset=HEADER.itemsize, shape=(self.capacity,))
+        log.info(f'Color History: {normpath(self.filepath)} ({len(self)} colors)')
+
+    def _newest(self, chunksize=256):
+        """ Yields packed rgba values from newest to oldest. """
+        end = self.total
+        start = max(end - self.capacity, 0)
+        while end > start:
+            chunkstart = max(end - chunksize, start)
+            indexes = numpy.arange(end-1, chunkstart-1, -1) % self.capacity
+            yield from (int(value) for value in self._records['rgba'][indexes])
+            end = chunkstart
+
+    def _buildIndex(self):
+        """ Build the frequency and recency index from the ring, unless it's
+            already current with the total in the file header.
+        """
+        total = self.total
+        if self._counts is not None and self._indexed == total:
+            return
+        records = self._records[:len(self)]
+        values, counts = numpy.unique(records['rgba'], return_counts=True)
+        lastseen = numpy.zeros(len(values), dtype=numpy.uint32)
+        numpy.maximum.at(lastseen, numpy.searchsorted(values, records['rgba']), records['time'])
+        self._counts = dict(zip(values.tolist(), counts.tolist()))
+        self._lastseen = dict(zip(values.tolist(), lastseen.tolist()))
+        self._indexed = total
+
+    def _forget(self, value):
+        """ Remove one occurrence of value from the index. Its last seen
+            time is kept, it can only be older than other occurrences.
+        """
+        self._counts[value] -= 1
+        if self._counts[value] <= 0:
+            del self._counts[value]
+            del self._lastseen[value]
+
+
+def sharedHistory(filepath=None):
+    """ Returns the History for filepath shared by everything in this
+        process, opening it on first use. Each ColorPicker uses this so
+        pooled pickers share one memory map and one index.
+    """
+    filepath = normpath(filepath or FILEPATH)
+    if filepath not in _SHARED:
+        _SHARED[filepath] = History(filepath)
+    return _SHARED[filepath]
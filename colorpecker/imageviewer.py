@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from colorpecker import log  # noqa
+from colorpecker.tiledimage import TiledImage, openImage
+from PySide6 import QtCore, QtGui
+from qtemplate import QTemplateWidget
+
+
+class ImageViewer(QTemplateWidget):
+    """ Displays a downsampled preview of an image file. The Magnifier reads
+        full resolution pixels under the cursor through cropAt().
+    """
+    TMPLSTR = """
+      <QWidget layout='QVBoxLayout()' padding='0'>
+        <Set windowTitle='Color Pecker'/>
+        <QLabel id='preview'>
+          <Set alignment='Qt.AlignLeft | Qt.AlignTop'/>
+        </QLabel>
+      </QWidget>
+    """
+
+    def __init__(self, image, maxsize=1024, parent=None):
+        super(ImageViewer, self).__init__(parent=parent)
+        self.image = image if isinstance(image, TiledImage) else openImage(image)
+        overview = self.image.overview(maxsize)
+        self.scale = self.image.width / float(overview.width())  # Image pixels per preview pixel
+        self.ids.preview.setPixmap(QtGui.QPixmap.fromImage(overview))
+        self.ids.preview.setFixedSize(overview.size())
+        self.setWindowTitle(f'Color Pecker - {self.image}')
+        log.info(f'Opened image {self.image}')
+
+    def mapToImage(self, gpos):
+        """ Returns the image pixel (x, y) under the global position. """
+        pos = self.ids.preview.mapFromGlobal(gpos)
+        return int(pos.x()*self.scale), int(pos.y()*self.scale)
+
+    def cropAt(self, gpos, size):
+        """ Returns a size x size QImage of full resolution pixels centered
+            on the global position.
+        """
+        x, y = self.mapToImage(gpos)
+        return self.image.cropImage(x - int(size/2), y - int(size/2), size, size)
+
+    def grabRegion(self, rect):
+        """ Returns a QImage of the global rect from the preview. The preview
+            is used so huge regions don't decode every tile they cover.
+        """
+        topleft = self.ids.preview.mapFromGlobal(rect.topLeft())
+        return self.ids.preview.pixmap().copy(QtCore.QRect(topleft, rect.size())).toImage()
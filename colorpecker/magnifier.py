@@ -1,9 +1,171 @@
 # -*- coding: utf-8 -*-
+import math
+import numpy
+import threading
 from colorpecker import log  # noqa
+from colorpecker.cvd import simulateImage
 from os.path import dirname
 from PySide6 import QtCore, QtGui, QtWidgets
 from qtemplate import QTemplateWidget
 
+MINZOOM = 1/32      # Furthest zoom out, 1 display pixel per 32 screen pixels
+MAXZOOM = 32        # Furthest zoom in
+GRIDCELL = 64       # Size of ScreenIndex grid cells in logical pixels
+
+# Builds pyramid levels. Not the global pool, Qt uses that to split up
+# large smooth scales and would wait on itself with a single core.
+POOL = QtCore.QThreadPool()
+POOL.setMaxThreadCount(1)
+
+
+class ScreenIndex(QtCore.QObject):
+    """ Cached layout of the screens for mapping global positions to screen
+        pixels. A coarse grid over the virtual desktop holds the screen each
+        cell is in, or the nearest screen for cells in gaps between screens,
+        so a lookup is one grid read. Only cells on a screen edge need to
+        check the screens. The grid is rebuilt when a screen is added,
+        removed or changes geometry or scale.
+    """
+    changed = QtCore.Signal()   # Called after the index was rebuilt
+
+    def __init__(self, parent=None):
+        super(ScreenIndex, self).__init__(parent)
+        self.screens = []       # Screens in QApplication.screens() order
+        self._rects = []        # (left, top, right, bottom, dpr) per screen
+        self._origin = (0, 0)   # Global position of the grid's top left
+        self._grid = None       # Screen index per cell, -1 if on an edge
+        app = QtWidgets.QApplication.instance()
+        app.screenAdded.connect(self._screenAdded)
+        app.screenRemoved.connect(self.rebuild)
+        for screen in app.screens():
+            self._watchScreen(screen)
+        self.rebuild()
+
+    def rebuild(self, *args):
+        """ Rebuild the grid from the current screen layout. """
+        self.screens = QtWidgets.QApplication.screens()
+        if not self.screens:
+            return
+        self._rects = []
+        for screen in self.screens:
+            geometry = screen.geometry()
+            self._rects.append((geometry.left(), geometry.top(), geometry.right()+1,
+                geometry.bottom()+1, screen.devicePixelRatio()))
+        self._buildGrid()
+        log.debug(f'ScreenIndex: {len(self.screens)} screens, {self._grid.shape} grid')
+        self.changed.emit()
+
+    def _buildGrid(self):
+        """ Build the grid of screen indexes from self._rects. """
+        rects = numpy.array([rect[:4] for rect in self._rects], dtype=numpy.int64)
+        left, top = rects[:,0].min(), rects[:,1].min()
+        cols = -(-(rects[:,2].max() - left) // GRIDCELL)
+        rows = -(-(rects[:,3].max() - top) // GRIDCELL)
+        x0 = left + numpy.arange(cols) * GRIDCELL
+        y0 = top + numpy.arange(rows) * GRIDCELL
+        # Start with the nearest screen to each cell, cells in a gap with a
+        # different nearest screen at each corner are checked per lookup.
+        # Then mark cells partly on a screen without being fully on it.
+        corners = [(ox, oy) for ox in (0, GRIDCELL-1) for oy in (0, GRIDCELL-1)]
+        nearest = numpy.array([self._nearestGrid(rects, x0 + ox, y0 + oy) for ox, oy in corners])
+        grid = numpy.where((nearest == nearest[0]).all(axis=0), nearest[0], -1).astype(numpy.int16)
+        for l, t, r, b in rects:
+            xfull, xpart = (x0 >= l) & (x0 + GRIDCELL <= r), (x0 + GRIDCELL > l) & (x0 < r)
+            yfull, ypart = (y0 >= t) & (y0 + GRIDCELL <= b), (y0 + GRIDCELL > t) & (y0 < b)
+            grid[ypart[:,None] & xpart[None,:] & ~(yfull[:,None] & xfull[None,:])] = -1
+        self._origin, self._grid = (int(left), int(top)), grid
+
+    def _nearestGrid(self, rects, xs, ys):
+        """ Returns the index of the nearest rect to each xs, ys point. """
+        dx = numpy.maximum(numpy.maximum(rects[:,0,None] - xs, xs - rects[:,2,None] + 1), 0)
+        dy = numpy.maximum(numpy.maximum(rects[:,1,None] - ys, ys - rects[:,3,None] + 1), 0)
+        return (dx[:,None,:]**2 + dy[:,:,None]**2).argmin(axis=0)
+
+    def map(self, gpos):
+        """ Returns (index, pos) of the screen at the global position and the
+            physical pixel position in that screen. Positions in a gap
+            between screens or off the desktop are clamped to the nearest
+            screen.
+        """
+        x, y = gpos.x(), gpos.y()
+        rows, cols = self._grid.shape
+        col = (x - self._origin[0]) // GRIDCELL
+        row = (y - self._origin[1]) // GRIDCELL
+        index = int(self._grid[row, col]) if 0 <= col < cols and 0 <= row < rows else -1
+        if index < 0:
+            index = self._nearest(x, y)
+        left, top, right, bottom, dpr = self._rects[index]
+        x, y = min(max(x, left), right - 1), min(max(y, top), bottom - 1)
+        return index, QtCore.QPoint(int((x - left) * dpr), int((y - top) * dpr))
+
+    def devicePixelRatio(self, index):
+        """ Returns the device pixel ratio of the screen at index. """
+        return self._rects[index][4]
+
+    def _nearest(self, x, y):
+        """ Returns the index of the screen containing or nearest x,y. """
+        def distance(rect):
+            dx = max(rect[0] - x, x - rect[2] + 1, 0)
+            dy = max(rect[1] - y, y - rect[3] + 1, 0)
+            return dx*dx + dy*dy
+        return min(range(len(self._rects)), key=lambda i: distance(self._rects[i]))
+
+    def _screenAdded(self, screen):
+        self._watchScreen(screen)
+        self.rebuild()
+
+    def _watchScreen(self, screen):
+        """ Rebuild when the screen moves, resizes or changes scale. """
+        screen.geometryChanged.connect(self.rebuild)
+        screen.logicalDotsPerInchChanged.connect(self.rebuild)
+
+
+class Pyramid:
+    """ Mipmap pyramid of a screenshot, level n is 1/2^n of the full size
+        with each pixel averaging the 2x2 pixels below it. Levels are built
+        on demand in POOL, until a level is ready the closest finer level
+        is returned in its place.
+    """
+
+    def __init__(self, image):
+        self._levels = [image]      # Built levels, level 0 is the screenshot
+        self._target = 0            # Deepest level requested
+        self._building = False      # True while a build is running
+        self._lock = threading.Lock()
+
+    @property
+    def image(self):
+        """ Returns the full size screenshot. """
+        return self._levels[0]
+
+    def level(self, level):
+        """ Returns (image, level) for the requested level, or the deepest
+            built level below it while the requested one is being built.
+        """
+        with self._lock:
+            if level < len(self._levels):
+                return self._levels[level], level
+            self._target = max(self._target, level)
+            if not self._building:
+                self._building = True
+                POOL.start(self._build)
+            return self._levels[-1], len(self._levels) - 1
+
+    def _build(self):
+        """ Build levels until the target level exists. Runs off the UI
+            thread, QImage is safe to use from any thread.
+        """
+        while True:
+            with self._lock:
+                if len(self._levels) > self._target:
+                    self._building = False
+                    return
+                image = self._levels[-1]
+            width, height = max(image.width() // 2, 1), max(image.height() // 2, 1)
+            half = image.scaled(width, height, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+            with self._lock:
+                self._levels.append(half)
+
 
 class Magnifier(QTemplateWidget):
     TMPLSTR = f"""
@@ -22,6 +184,7 @@ class Magnifier(QTemplateWidget):
     """
     colorChanged = QtCore.Signal(QtGui.QColor)      # Called when moving the mouse
     colorSelected = QtCore.Signal(QtGui.QColor)     # Called when selecting a color
+    regionSelected = QtCore.Signal(QtGui.QImage)    # Called when dragging a region
     cancelled = QtCore.Signal()                     # Called when cancelling selection
 
     def __init__(self, size=21, zoom=8, border=5, radius=20, parent=None):
@@ -31,18 +194,26 @@ class Magnifier(QTemplateWidget):
         self.border = border                        # Magnifier border-width
         self.radius = radius                        # Magnifier border-radius
         self.qcolor = None                          # Current qcolor
+        self.viewer = None                          # ImageViewer to sample instead of screens
+        self.cvd = None                             # Color vision deficiency to preview
         self._zsize = size*zoom                     # Size of zoomed in screenshot
         self._fsize = self._zsize+self.border*2     # Fill size of magnifier
-        self._screenshots = None                    # Holds desktop screenshots
+        self._screenshots = None                    # Holds desktop screenshot pyramids
+        self._screens = ScreenIndex(self)           # Maps global positions to screens
+        self._screens.changed.connect(self._screensChanged)
+        self._wheel = 0                             # Wheel rotation not yet applied
         self._timer = None                          # QTimer used to update the data
         self._lastpos = None                        # Last position we updated
+        self._presspos = None                       # Global position drag started
+        self._rubberband = None                     # Displays the dragged region
         self._fadein = QtCore.QPropertyAnimation(self, b'windowOpacity')
         self._fadeout = QtCore.QPropertyAnimation(self, b'windowOpacity')
         self.setWindowOpacity(0.0)
     
     def show(self):
         """ Initialize the magnifier when first displayed. """
-        self._grabScreenshots()
+        if self.viewer is None:
+            self._grabScreenshots()
         self._setMagnifierSize()
         self._updateTargets()
         super(Magnifier, self).show()
@@ -57,12 +228,39 @@ class Magnifier(QTemplateWidget):
     
     def close(self):
         self._timer.stop()
+        self._presspos = None
+        if self._rubberband:
+            self._rubberband.hide()
         self._fadeout.setDuration(200)
         self._fadeout.setStartValue(1.0)
         self._fadeout.setEndValue(0.0)
         self._fadeout.finished.connect(super(Magnifier, self).close)
         self._fadeout.start()
     
+    def setViewer(self, viewer):
+        """ Sample colors from an ImageViewer rather than the screens. Set
+            to None to go back to sampling the screens.
+        """
+        self.viewer = viewer
+        self.setZoom(self.zoom)
+
+    def setZoom(self, zoom):
+        """ Set the zoom, below 1 the magnifier shows a wide area of the
+            screen drawn from the screenshot pyramid. ImageViewers have no
+            pyramid so they stop at 1.
+        """
+        minzoom = 1 if self.viewer is not None else MINZOOM
+        self.zoom = min(max(zoom, minzoom), MAXZOOM)
+        self._updateTargets()
+        self._lastpos = None
+
+    def setCvd(self, cvd):
+        """ Preview the zoomed pixels as seen with one of the cvd color
+            vision deficiencies. Set to None to show the real colors.
+        """
+        self.cvd = cvd
+        self._lastpos = None
+
     def _startTrackingTimer(self):
         """ Start the update timer. """
         if self._timer is None:
@@ -88,36 +286,142 @@ class Magnifier(QTemplateWidget):
                 QtGui.QCursor.setPos(pos.x(), pos.y()+1)
             case QtCore.Qt.Key_Return:
                 self.colorChanged.emit(self.qcolor)
+                self.colorSelected.emit(self.qcolor)
                 self.close()
             case QtCore.Qt.Key_Escape:
                 self.cancelled.emit()
                 self.close()
     
+    def wheelEvent(self, event):
+        """ Zoom in or out by a factor of 2 per wheel step. """
+        self._wheel += event.angleDelta().y()
+        steps = int(self._wheel / 120)
+        if steps:
+            self._wheel -= steps * 120
+            self.setZoom(self.zoom * 2**steps)
+            self._updateDisplay()
+
+    def mousePressEvent(self, event):
+        """ Start tracking a region drag. """
+        if event.button() == QtCore.Qt.LeftButton:
+            self._presspos = QtGui.QCursor.pos()
+
     def mouseReleaseEvent(self, event):
-        """ Grab the color or cancel. """
+        """ Grab the color, the dragged region or cancel. """
         if event.button() == QtCore.Qt.LeftButton:
-            self.colorChanged.emit(self.qcolor)
+            region = self._dragRegion()
+            if region is not None:
+                self.regionSelected.emit(self.grabRegion(region))
+            else:
+                self.colorChanged.emit(self.qcolor)
+                self.colorSelected.emit(self.qcolor)
         elif event.button() == QtCore.Qt.RightButton:
             self.cancelled.emit()
         self.close()
-    
+
+    def grabRegion(self, rect):
+        """ Returns a QImage of the global rect from the screenshot of the
+            display containing the center of the rect.
+        """
+        if self.viewer is not None:
+            return self.viewer.grabRegion(rect)
+        index, spos = self._screens.map(rect.center())
+        dpr = self._screens.devicePixelRatio(index)
+        topleft = spos - (rect.center() - rect.topLeft()) * dpr
+        width, height = round(rect.width() * dpr), round(rect.height() * dpr)
+        return self._screenshots[index].image.copy(topleft.x(), topleft.y(), width, height)
+
+    def _dragRegion(self):
+        """ Returns the global QRect being dragged or None if the mouse has
+            not moved far enough from where it was pressed.
+        """
+        if self._presspos is None:
+            return None
+        rect = QtCore.QRect(self._presspos, QtGui.QCursor.pos()).normalized()
+        if rect.width() <= 3 and rect.height() <= 3:
+            return None
+        return rect
+
+    def _cropAt(self, gpos, size):
+        """ Returns a size x size QImage centered on the global position. """
+        if self.viewer is not None:
+            return self.viewer.cropAt(gpos, size)
+        return self._levelCropAt(gpos, 0, size)
+
+    def _levelCropAt(self, gpos, level, size):
+        """ Returns a size x size QImage of pyramid level centered on the
+            global position. If the level isn't built yet the deepest built
+            level is cropped at its own scale, so the frame costs the same
+            and shows less area until the level is ready.
+        """
+        screenshot, spos = self._screenshotAt(gpos)
+        image, built = screenshot.level(level)
+        if built < level:
+            self._lastpos = None  # Redraw when the level is ready
+        x = (spos.x() >> built) - size // 2
+        y = (spos.y() >> built) - size // 2
+        return image.copy(x, y, size, size)
+
+    def _zoomedAt(self, gpos):
+        """ Returns the _zsize x _zsize QImage to display at the global
+            position. Zoomed in, an odd number of pixels is cropped so the
+            sampled pixel is centered and scaled up. Zoomed out, the crop is
+            taken 1:1 from a pyramid level, so the cost of a frame is the
+            same at any zoom.
+        """
+        if self.zoom >= 1:
+            span = math.ceil(self._zsize / self.zoom) | 1
+            cropped = self._cropAt(gpos, span)
+            preview = simulateImage(cropped, self.cvd) if self.cvd else cropped
+            return preview.scaled(self._zsize, self._zsize)
+        level = round(math.log2(1 / self.zoom))
+        cropped = self._levelCropAt(gpos, level, self._zsize)
+        return simulateImage(cropped, self.cvd) if self.cvd else cropped
+
+    def _colorAt(self, gpos):
+        """ Returns the QColor of the full resolution pixel at gpos. """
+        if self.viewer is not None:
+            return self.viewer.cropAt(gpos, 1).pixelColor(0, 0)
+        screenshot, spos = self._screenshotAt(gpos)
+        return screenshot.image.pixelColor(spos)
+
+    def _screenshotAt(self, gpos):
+        """ Returns the screenshot of the display containing gpos, or the
+            nearest display if gpos is between displays, and the physical
+            pixel position of gpos in that screenshot.
+        """
+        index, spos = self._screens.map(gpos)
+        return self._screenshots[index], spos
+
+    def _screensChanged(self):
+        """ Retake the screenshots when the screen layout changes. """
+        self._lastpos = None
+        if self.isVisible() and self.viewer is None:
+            self._grabScreenshots()
+
     def _grabScreenshots(self):
-        """ Take a screenshot of all displays. """
+        """ Take a screenshot of all displays. Pyramid levels are built the
+            first time each screen is zoomed out.
+        """
         self._screenshots = []
         for screen in QtWidgets.QApplication.screens():
-            self._screenshots.append(screen.grabWindow(0))
+            self._screenshots.append(Pyramid(screen.grabWindow(0).toImage()))
     
     def _setMagnifierSize(self):
         """ Set the magnifier size based on self.size, and self.width. """
         self.ids.magnifier.setFixedSize(self._fsize, self._fsize)
     
     def _updateTargets(self):
-        """ Move and resize the target squares in the center of the magnifier. """
-        bpos = round((self.size*self.zoom)/2.0)
-        self.ids.bsquare.move(bpos+1, bpos+1)
-        self.ids.bsquare.resize(self.zoom, self.zoom)
-        self.ids.wsquare.move(bpos, bpos)
-        self.ids.wsquare.resize(self.zoom+2, self.zoom+2)
+        """ Move and resize the target squares in the center of the magnifier,
+            they cover one screen pixel or a minimum of one display pixel.
+        """
+        span = math.ceil(self._zsize / self.zoom) | 1 if self.zoom >= 1 else self._zsize
+        pixel = max(round(self._zsize / span), 1)
+        bpos = self.border + round((self._zsize - pixel) / 2.0)
+        self.ids.bsquare.move(bpos, bpos)
+        self.ids.bsquare.resize(pixel, pixel)
+        self.ids.wsquare.move(bpos-1, bpos-1)
+        self.ids.wsquare.resize(pixel+2, pixel+2)
 
     def _updateDisplay(self):
         """ Updates the magnifier display. """
@@ -127,18 +431,8 @@ class Magnifier(QTemplateWidget):
         if gpos == self._lastpos:
             return
         self._lastpos = gpos
-        # Get screenshot for the current display
-        for i, screen in enumerate(QtWidgets.QApplication.screens()):
-            geometry = screen.geometry()
-            if geometry.contains(gpos):
-                spos = gpos - screen.geometry().topLeft()
-                screenshot = self._screenshots[i]
-                break
         # Get the portion of the screenshot we care about
-        screenx = spos.x() - int(self.size/2)
-        screeny = spos.y() - int(self.size/2)
-        cropped = screenshot.copy(screenx, screeny, self.size, self.size)
-        zoomed = cropped.scaled(self.size*self.zoom, self.size*self.zoom)
+        zoomed = self._zoomedAt(gpos)
         # Crop zoomed pixmap to have rounded corners
         path = QtGui.QPainterPath()
         rect = QtCore.QRectF(self.border, self.border, self._zsize, self._zsize)
@@ -147,7 +441,7 @@ class Magnifier(QTemplateWidget):
         rounded.fill(QtCore.Qt.transparent)
         painter = QtGui.QPainter(rounded)
         painter.setClipPath(path)
-        painter.drawPixmap(self.border, self.border, zoomed)
+        painter.drawImage(self.border, self.border, zoomed)
         painter.end()
         # Set zoomed screenshot as the background
         brush = QtGui.QBrush(rounded)
@@ -155,11 +449,17 @@ class Magnifier(QTemplateWidget):
         palette.setBrush(QtGui.QPalette.Window, brush)
         self.ids.magnifier.setAutoFillBackground(True)
         self.ids.magnifier.setPalette(palette)
+        # Show the region being dragged
+        region = self._dragRegion()
+        if region is not None:
+            if self._rubberband is None:
+                self._rubberband = QtWidgets.QRubberBand(QtWidgets.QRubberBand.Rectangle)
+            self._rubberband.setGeometry(region)
+            self._rubberband.show()
         # Move the window to the correct location
         x = gpos.x() - round(self.width()/2.0)
         y = gpos.y() - round(self.height()/2.0)
         self.move(x, y)
         # Get the current color and emit the colorChanged signal
-        center = (self.size/2, self.size/2)
-        self.qcolor = cropped.toImage().pixelColor(*center)
+        self.qcolor = self._colorAt(gpos)
         self.colorChanged.emit(self.qcolor)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+import struct
+from colorpecker import log  # noqa
+from colorpecker.color import COLORFORMATS, RgbColor
+from colorpecker.colorbuffer import ColorBuffer, unpack
+from colorpecker.colorspace import lab2rgb
+from collections import namedtuple
+from os.path import splitext
+from PySide6 import QtCore, QtGui
+
+# Readers are generators yielding PaletteEntry one at a time, so large
+# palettes are streamed from disk rather than loaded in one go.
+PaletteEntry = namedtuple('PaletteEntry', 'name,color')
+REGEX_GPL = re.compile(r'^\s*(\d+)\s+(\d+)\s+(\d+)\s*(.*)$')
+REGEX_CSSVAR = re.compile(r'--([\w-]+)\s*:\s*([^;]+);')
+CHUNKSIZE = 65536
+
+# ASE color block type and ACO rgb color space
+ASE_COLOR = 0x0001
+ACO_RGB = 0
+
+
+def readGpl(handle):
+    """ Read a GIMP .gpl palette from a text file handle. """
+    for line in handle:
+        if matches := re.findall(REGEX_GPL, line):
+            r, g, b, name = matches[0]
+            color = RgbColor(int(r), int(g), int(b), scale=255)
+            yield PaletteEntry(name.strip() or color.hex, color)
+
+
+def writeGpl(handle, entries, name='Color Pecker', cformat=None):
+    """ Write a GIMP .gpl palette to a text file handle. """
+    handle.write(f'GIMP Palette\nName: {name}\nColumns: 0\n#\n')
+    for entry in entries:
+        r, g, b = (round(x*255) for x in entry.color.rgb)
+        handle.write(f'{r:3d} {g:3d} {b:3d}\t{entry.name}\n')
+
+
+def readCss(handle):
+    """ Read CSS custom properties (--name: color;) from a text file handle.
+        Values are parsed with RgbColor.fromText, others are skipped.
+    """
+    buffer = ''
+    for line in handle:
+        buffer += line
+        if ';' not in line:
+            continue
+        for name, value in re.findall(REGEX_CSSVAR, buffer):
+            try:
+                yield PaletteEntry(name, RgbColor.fromText(value.strip()))
+            except Exception:
+                log.debug(f'Skipping CSS property --{name}: {value}')
+        buffer = buffer[buffer.rindex(';')+1:]
+
+
+def writeCss(handle, entries, name=None, cformat=COLORFORMATS['hex']):
+    """ Write CSS custom properties to a text file handle. """
+    handle.write(':root {\n')
+    for entry in entries:
+        handle.write(f'  --{_cssName(entry.name)}: {entry.color.format(cformat)};\n')
+    handle.write('}\n')
+
+
+def readJson(handle):
+    """ Read a JSON palette from a text file handle. The file should be a
+        list of {"name": name, "color": color} objects or of color strings.
+        Elements of the list are decoded one at a time as the file is read.
+    """
+    decoder = json.JSONDecoder()
+    buffer, index, started = '', 0, False
+    while True:
+        chunk = handle.read(CHUNKSIZE)
+        buffer = buffer[index:] + chunk
+        index = 0
+        while True:
+            while index < len(buffer) and buffer[index] in ' \t\r\n,':
+                index += 1
+            if index < len(buffer) and not started:
+                if buffer[index] != '[':
+                    raise Exception('JSON palette should be a list of colors')
+                started, index = True, index + 1
+                continue
+            if index < len(buffer) and buffer[index] == ']':
+                return
+            try:
+                value, index = decoder.raw_decode(buffer, index)
+            except ValueError:
+                break
+            yield _jsonEntry(value)
+        if not chunk:
+            if buffer[index:].strip():
+                raise Exception('Unexpected end of JSON palette')
+            return
+
+
+def writeJson(handle, entries, name=None, cformat=COLORFORMATS['hex']):
+    """ Write a JSON palette to a text file handle, one entry per line. """
+    handle.write('[')
+    for i, entry in enumerate(entries):
+        item = json.dumps({'name': entry.name, 'color': entry.color.format(cformat)})
+        handle.write(f'{"," if i else ""}\n  {item}')
+    handle.write('\n]\n')
+
+
+def readAse(handle):
+    """ Read an Adobe Swatch Exchange .ase palette from a binary file handle.
+        RGB, CMYK, LAB and Gray swatches are supported, groups are flattened.
+    """
+    signature, _, _, count = struct.unpack('>4sHHI', handle.read(12))
+    if signature != b'ASEF':
+        raise Exception('Not an Adobe Swatch Exchange file')
+    for _ in range(count):
+        blocktype, length = struct.unpack('>HI', handle.read(6))
+        block = handle.read(length)
+        if blocktype != ASE_COLOR:
+            continue
+        namelen = struct.unpack('>H', block[:2])[0]
+        name = block[2:2+namelen*2].decode('utf-16-be').rstrip('\x00')
+        offset = 2 + namelen*2
+        model = block[offset:offset+4].decode('ascii').strip().upper()
+        offset += 4
+        match model:
+            case 'RGB':
+                color = RgbColor(*struct.unpack('>3f', block[offset:offset+12]), scale=1)
+            case 'CMYK':
+                color = RgbColor.fromCmyk(*struct.unpack('>4f', block[offset:offset+16]))
+            case 'LAB':
+                l, a, b = struct.unpack('>3f', block[offset:offset+12])
+                color = RgbColor(*(min(max(float(x), 0), 1) for x in lab2rgb([l*100, a, b])), scale=1)
+            case 'GRAY':
+                gray = struct.unpack('>f', block[offset:offset+4])[0]
+                color = RgbColor(gray, gray, gray, scale=1)
+            case _:
+                log.debug(f'Skipping ASE swatch {name} with color model {model}')
+                continue
+        yield PaletteEntry(name or color.hex, color)
+
+
+def writeAse(handle, entries, name=None, cformat=None):
+    """ Write an Adobe Swatch Exchange .ase palette to a binary file handle.
+        The block count is patched in at the end so entries can be streamed.
+    """
+    start = handle.tell()
+    handle.write(struct.pack('>4sHHI', b'ASEF', 1, 0, 0))
+    count = 0
+    for entry in entries:
+        name = entry.name.encode('utf-16-be') + b'\x00\x00'
+        block = struct.pack('>H', len(name)//2) + name + b'RGB ' + struct.pack('>3fH', *entry.color.rgb, 2)
+        handle.write(struct.pack('>HI', ASE_COLOR, len(block)) + block)
+        count += 1
+    end = handle.tell()
+    handle.seek(start + 8)
+    handle.write(struct.pack('>I', count))
+    handle.seek(end)
+
+
+def readAco(handle):
+    """ Read an Adobe Photoshop .aco palette from a binary file handle. When
+        the file has a version 2 section it is read for the swatch names.
+        RGB, HSB, CMYK and LAB swatches are supported.
+    """
+    start = handle.tell()
+    version, count = struct.unpack('>HH', handle.read(4))
+    if version == 1:
+        handle.seek(count*10, 1)
+        header = handle.read(4)
+        if len(header) == 4 and struct.unpack('>H', header[:2])[0] == 2:
+            version, count = struct.unpack('>HH', header)
+        else:
+            handle.seek(start + 4)
+    if version not in (1, 2):
+        raise Exception('Not an Adobe Color Swatch file')
+    for _ in range(count):
+        space, w, x, y, z = struct.unpack('>5H', handle.read(10))
+        name = None
+        if version == 2:
+            namelen = struct.unpack('>I', handle.read(4))[0]
+            name = handle.read(namelen*2).decode('utf-16-be').rstrip('\x00')
+        match space:  # rgb, hsb, cmyk, lab
+            case 0: color = RgbColor(w, x, y, scale=65535)
+            case 1: color = RgbColor.fromHsv(w/65535.0, x/65535.0, y/65535.0)
+            case 2: color = RgbColor.fromCmyk(*(1-v/65535.0 for v in (w, x, y, z)))
+            case 7:
+                a, b = (v-65536 if v > 32767 else v for v in (x, y))
+                color = RgbColor(*(min(max(float(v), 0), 1) for v in lab2rgb([w/100.0, a/100.0, b/100.0])), scale=1)
+            case _:
+                log.debug(f'Skipping ACO swatch {name} with color space {space}')
+                continue
+        yield PaletteEntry(name or color.hex, color)
+
+
+def writeAco(handle, entries, name=None, cformat=None):
+    """ Write an Adobe Photoshop .aco palette with version 1 and 2 sections
+        to a binary file handle. Both sections list every entry, so entries
+        are packed into a ColorBuffer rather than held as objects.
+    """
+    colors, names = ColorBuffer(), []
+    for entry in entries:
+        colors.append(entry.color)
+        names.append(entry.name)
+    if len(colors) > 65535:
+        raise Exception(f'ACO palettes are limited to 65535 colors, not {len(colors)}')
+    for version in (1, 2):
+        handle.write(struct.pack('>HH', version, len(colors)))
+        for value, name in zip(colors.values, names):
+            rgb = (((int(value) >> shift) & 255) * 257 for shift in (24, 16, 8))
+            handle.write(struct.pack('>5H', ACO_RGB, *rgb, 0))
+            if version == 2:
+                name = name.encode('utf-16-be') + b'\x00\x00'
+                handle.write(struct.pack('>I', len(name)//2) + name)
+
+
+# Palette formats {extension: (reader, writer, binary)}
+PALETTEFORMATS = {
+    '.gpl': (readGpl, writeGpl, False),
+    '.css': (readCss, writeCss, False),
+    '.json': (readJson, writeJson, False),
+    '.ase': (readAse, writeAse, True),
+    '.aco': (readAco, writeAco, True),
+}
+
+
+def readPalette(filepath):
+    """ Read PaletteEntries from filepath, the format is chosen by the file
+        extension. This is a generator, the file is read as it is consumed.
+    """
+    reader, _, binary = _paletteFormat(filepath)
+    with open(filepath, 'rb' if binary else 'r', encoding=None if binary else 'utf-8') as handle:
+        yield from reader(handle)
+
+
+def writePalette(filepath, entries, name='Color Pecker', cformat=COLORFORMATS['hex']):
+    """ Write PaletteEntries to filepath, the format is chosen by the file
+        extension. Text formats that store color strings use cformat.
+    """
+    _, writer, binary = _paletteFormat(filepath)
+    with open(filepath, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as handle:
+        writer(handle, entries, name=name, cformat=cformat)
+
+
+class PaletteModel(QtCore.QAbstractListModel):
+    """ List model of palette entries for a QListView. Colors are kept in a
+        ColorBuffer and QColors are only built for the rows being painted,
+        so the view stays fast with 100k entry palettes.
+    """
+
+    def __init__(self, parent=None):
+        super(PaletteModel, self).__init__(parent)
+        self.colors = ColorBuffer()     # Packed palette colors
+        self.names = []                 # Palette entry names
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.colors)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return self.names[index.row()]
+        if role == QtCore.Qt.DecorationRole:
+            r, g, b, a = self.colors.pixels[index.row()]
+            return QtGui.QColor(int(r), int(g), int(b), int(a))
+        return None
+
+    def color(self, row):
+        """ Returns the RgbColor at row. """
+        return unpack(self.colors.values[row])
+
+    def entries(self):
+        """ Yields the PaletteEntries in the model. """
+        for value, name in zip(self.colors.values, self.names):
+            yield PaletteEntry(name, unpack(value))
+
+    def setEntries(self, entries):
+        """ Replace the model contents with an iterable of PaletteEntries.
+            The entries are read before the model is touched, so if reading
+            fails the model keeps its current contents.
+        """
+        colors, names = ColorBuffer(), []
+        for entry in entries:
+            colors.append(entry.color)
+            names.append(entry.name)
+        self.beginResetModel()
+        self.colors, self.names = colors, names
+        self.endResetModel()
+
+    def addEntry(self, entry):
+        """ Append a PaletteEntry to the model. """
+        row = len(self.colors)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.colors.append(entry.color)
+        self.names.append(entry.name)
+        self.endInsertRows()
+
+
+def _cssName(name):
+    """ Returns name as a valid CSS custom property name. """
+    return re.sub(r'[^\w-]+', '-', name.strip()).strip('-').lower() or 'color'
+
+
+def _jsonEntry(value):
+    """ Convert a decoded JSON palette element to a PaletteEntry. """
+    if isinstance(value, str):
+        color = RgbColor.fromText(value)
+        return PaletteEntry(color.hex, color)
+    color = RgbColor.fromText(value['color'])
+    return PaletteEntry(value.get('name') or color.hex, color)
+
+
+def _paletteFormat(filepath):
+    """ Returns the (reader, writer, binary) palette format for filepath. """
+    ext = splitext(filepath)[1].lower()
+    if ext not in PALETTEFORMATS:
+        raise Exception(f'Unknown palette format: {filepath}')
+    return PALETTEFORMATS[ext]
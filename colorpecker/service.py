@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# Asyncio service for converting many color strings at once. Requests are
+# queued and grouped into batches, each batch is converted in a worker pool
+# sized to the cores. The queue is bounded, callers wait on put when the
+# workers fall behind rather than growing memory without limit.
+#
+# Run as a server that speaks JSON lines on stdio or a unix socket:
+#     python -m colorpecker.service [--socket PATH]
+#     > {"id": 1, "colors": ["#f00", "hsl(120, 100%, 50%)"], "format": "rgb255"}
+#     < {"id": 1, "colors": ["rgb(255, 0, 0)", "rgb(0, 255, 0)"]}
+# Colors that can't be parsed are returned as null.
+import asyncio
+import json
+import os
+import signal
+import sys
+from argparse import ArgumentParser
+from colorpecker import log, streamhandler
+from colorpecker.color import COLORFORMATS, RgbColor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+BATCHSIZE = 512         # Max colors converted in one worker call
+BATCHDELAY = 0.002      # Seconds to wait for a batch to fill
+MAXPENDING = 65536      # Max colors queued before callers wait
+MAXREQUESTS = 64        # Max requests in flight per server connection
+MAXLINE = 1 << 24       # Max bytes in one request line
+
+
+@lru_cache(maxsize=65536)
+def convertText(text, cformat='hex'):
+    """ Returns text converted to the named color format or None if it can't
+        be parsed. Theme files repeat the same colors a lot, so results are
+        cached in each worker.
+    """
+    try:
+        return RgbColor.fromText(text).format(COLORFORMATS[cformat])
+    except Exception:
+        return None
+
+
+def convertBatch(texts, cformat='hex'):
+    """ Returns a list of texts converted to the named color format. This
+        runs in the worker pool, one call per batch. Batches mix requests
+        from many callers, so anything that isn't a string is returned as
+        None rather than failing the whole batch.
+    """
+    return [convertText(text, cformat) if isinstance(text, str) else None for text in texts]
+
+
+class ConversionService:
+    """ Batches color conversions from many concurrent callers. Use it as an
+        async context manager or call start() and stop() yourself.
+            async with ConversionService() as service:
+                colors = await service.convertMany(['#f00', '#0f0'], 'rgb255')
+    """
+
+    def __init__(self, workers=None, processes=True, batchsize=BATCHSIZE,
+            batchdelay=BATCHDELAY, maxpending=MAXPENDING):
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes          # Use processes, parsing holds the GIL
+        self.batchsize = batchsize          # Max colors per worker call
+        self.batchdelay = batchdelay        # Seconds to wait for a batch to fill
+        self.maxpending = maxpending        # Max colors queued
+        self._queue = None                  # Queue of (text, cformat, future)
+        self._executor = None               # Worker pool
+        self._running = None                # Semaphore limiting batches in flight
+        self._batcher = None                # Task grouping the queue into batches
+        self._batches = set()               # Batch tasks in flight
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    async def start(self):
+        """ Start the worker pool and the batching task. """
+        pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        self._executor = pool(max_workers=self.workers)
+        self._queue = asyncio.Queue(maxsize=self.maxpending)
+        self._running = asyncio.Semaphore(self.workers * 2)
+        self._batcher = asyncio.create_task(self._batchLoop())
+        log.info(f'ConversionService: {self.workers} {pool.__name__} workers')
+
+    async def stop(self):
+        """ Finish queued conversions and shut down the worker pool. """
+        await self._queue.join()
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, *self._batches, return_exceptions=True)
+        self._executor.shutdown()
+
+    async def convert(self, text, cformat='hex'):
+        """ Returns text converted to the named color format or None. """
+        return (await self.convertMany([text], cformat))[0]
+
+    async def convertMany(self, texts, cformat='hex'):
+        """ Returns a list of texts converted to the named color format, None
+            for any that can't be parsed. Waits while the queue is full.
+        """
+        if cformat not in COLORFORMATS:
+            raise Exception(f'Unknown color format: {cformat}')
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            await self._queue.put((text, cformat, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _batchLoop(self):
+        """ Pull items off the queue into batches of up to batchsize and
+            start a conversion for each. Waits up to batchdelay for a batch
+            to fill, so a lone request isn't held back for long.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batchdelay
+            while len(batch) < self.batchsize:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            await self._running.acquire()
+            task = asyncio.create_task(self._convertBatch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _convertBatch(self, batch):
+        """ Convert one batch in the worker pool and resolve its futures. """
+        loop = asyncio.get_running_loop()
+        try:
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for cformat, items in groups.items():
+                texts = [text for text, _, _ in items]
+                try:
+                    results = await loop.run_in_executor(self._executor, convertBatch, texts, cformat)
+                    for (_, _, future), result in zip(items, results):
+                        if not future.done(): future.set_result(result)
+                except Exception as err:
+                    for _, _, future in items:
+                        if not future.done(): future.set_exception(err)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            self._running.release()
+
+
+async def handleClient(service, reader, writer):
+    """ Serve JSON line requests from one client. Requests are converted
+        concurrently and responses are written as they complete, the id in
+        each response matches its request.
+    """
+    lock = asyncio.Lock()
+    inflight = asyncio.Semaphore(MAXREQUESTS)
+
+    async def respond(request):
+        try:
+            colors = await service.convertMany(request['colors'], request.get('format', 'hex'))
+            response = {'id': request.get('id'), 'colors': colors}
+        except Exception as err:
+            response = {'id': request.get('id'), 'error': str(err)}
+        try:
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            inflight.release()
+
+    tasks = set()
+    while line := await reader.readline():
+        if not line.strip():
+            continue
+        await inflight.acquire()
+        request = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise Exception('expected a JSON object')
+            if not isinstance(request.get('colors'), list):
+                raise Exception('colors must be a list')
+            task = asyncio.create_task(respond(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        except Exception as err:
+            rid = request.get('id') if isinstance(request, dict) else None
+            writer.write(json.dumps({'id': rid, 'error': f'Invalid request: {err}'}).encode() + b'\n')
+            inflight.release()
+    await asyncio.gather(*tasks)
+    writer.close()
+
+
+class StdoutWriter:
+    """ Minimal StreamWriter for stdout. Pipe transports refuse regular
+        files, which stdout often is when redirected.
+    """
+
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        sys.stdout.buffer.flush()
+
+
+async def serveStdio(service):
+    """ Serve requests read from stdin, responses are written to stdout. """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAXLINE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    await handleClient(service, reader, StdoutWriter())
+
+
+async def serveSocket(service, path):
+    """ Serve requests from any number of clients on a unix socket. """
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(lambda r, w: handleClient(service, r, w), path, limit=MAXLINE)
+    log.info(f'ConversionService listening on {path}')
+    async with server:
+        await server.serve_forever()
+
+
+async def main(opts):
+    # Shut down the worker pool cleanly when terminated
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    async with ConversionService(opts.workers, not opts.threads) as service:
+        if opts.socket:
+            await serveSocket(service, opts.socket)
+        else:
+            await serveStdio(service)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Color conversion service')
+    parser.add_argument('--socket', help='Listen on a unix socket rather than stdio')
+    parser.add_argument('--workers', type=int, help='Number of workers (default: cores)')
+    parser.add_argument('--threads', action='store_true', help='Use threads rather than processes')
+    parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+    opts = parser.parse_args()
+    if opts.debug: log.setLevel('DEBUG')
+    # stdout carries responses, keep log messages out of it
+    streamhandler.setStream(sys.stderr)
+    try:
+        asyncio.run(main(opts))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from os.path import normpath
 from colorpecker import STORAGEDIR, log
-from colorpecker.color import COLORFORMATS
+from colorpecker.color import COLORFORMATS, RgbColor
+from colorpecker.cvd import MATRICES
 from functools import partial
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import Qt
@@ -43,6 +44,21 @@ class Settings:
         except Exception:
             return COLORFORMATS['hex']
 
+    @property
+    def cvd(self):
+        """ Get the Color Blindness preview or None. """
+        value = self.storage.value('cvd', '')
+        return value if value in MATRICES else None
+
+    @property
+    def contrastColor(self):
+        """ Get the Contrast Background color or None. """
+        try:
+            value = self.storage.value('contrastColor', '')
+            return RgbColor.fromHex(value) if value else None
+        except Exception:
+            return None
+
     def _initStorage(self):
         """ Initialize settings storage. """
         filepath = f'{STORAGEDIR}/ColorPecker/colorpecker.ini'
@@ -52,6 +68,25 @@ class Settings:
     def _initMainMenu(self):
         """ Initialize the main menu. """
         self.menu = QtWidgets.QMenu()
+        # Open Image
+        self.menu.openImage = QtGui.QAction('Open Image...', self.parent)
+        self.menu.openImage.triggered.connect(lambda: self.parent.openImage())
+        self.menu.addAction(self.menu.openImage)
+        # Palette
+        self.menu.openPalette = QtGui.QAction('Open Palette...', self.parent)
+        self.menu.openPalette.triggered.connect(lambda: self.parent.openPalette())
+        self.menu.addAction(self.menu.openPalette)
+        self.menu.savePalette = QtGui.QAction('Save Palette...', self.parent)
+        self.menu.savePalette.triggered.connect(lambda: self.parent.savePalette())
+        self.menu.addAction(self.menu.savePalette)
+        self.menu.addToPalette = QtGui.QAction('Add Color to Palette', self.parent)
+        self.menu.addToPalette.triggered.connect(lambda: self.parent.addToPalette())
+        self.menu.addAction(self.menu.addToPalette)
+        # Recent Colors
+        self.menu.recentColors = QtWidgets.QMenu('Recent Colors')
+        self.menu.recentColors.aboutToShow.connect(self.updateRecentColors)
+        self.menu.addMenu(self.menu.recentColors)
+        self.menu.addSeparator()
         # Always on Top
         self.menu.alwaysOnTop = QtGui.QAction('Always on Top', self.parent)
         self.menu.alwaysOnTop.setCheckable(True)
@@ -75,6 +110,25 @@ class Settings:
             self.menu.colorFormats.addAction(action)
         self.menu.addMenu(self.menu.colorFormats)
         self.setColorFormat(self.colorFormat)
+        # Color Blindness
+        self.menu.cvds = QtWidgets.QMenu('Color Blindness')
+        for cvd in (None,) + tuple(MATRICES):
+            action = QtGui.QAction(cvd.title() if cvd else 'None', self.parent)
+            action.setCheckable(True)
+            action.triggered.connect(partial(self.setCvd, cvd))
+            action.setProperty('cvd', cvd or '')
+            self.menu.cvds.addAction(action)
+        self.menu.addMenu(self.menu.cvds)
+        self.setCvd(self.cvd)
+        # Contrast Background
+        self.menu.addSeparator()
+        self.menu.setContrastColor = QtGui.QAction('Set Contrast Background', self.parent)
+        self.menu.setContrastColor.triggered.connect(lambda: self.setContrastColor(self.parent.color))
+        self.menu.addAction(self.menu.setContrastColor)
+        self.menu.clearContrastColor = QtGui.QAction('Clear Contrast Background', self.parent)
+        self.menu.clearContrastColor.triggered.connect(lambda: self.setContrastColor(None))
+        self.menu.addAction(self.menu.clearContrastColor)
+        self.setContrastColor(self.contrastColor)
         # Link main menu to parent widget
         self.parent.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.parent.customContextMenuRequested.connect(self.showMainMenu)
@@ -137,6 +191,33 @@ class Settings:
         self.storage.setValue('colorFormat', cformat.name)
         self.storage.sync()
 
+    def setCvd(self, cvd=None):
+        """ Set the color vision deficiency previewed in the magnifier. """
+        log.info(f'setCvd({cvd})')
+        self.parent.setCvd(cvd)
+        # Update menu display and save setting
+        for action in self.menu.cvds.actions():
+            action.setChecked((cvd or '') == action.property('cvd'))
+        self.storage.setValue('cvd', cvd or '')
+        self.storage.sync()
+
+    def setContrastColor(self, color=None):
+        """ Set the background color to show the contrast ratio against. """
+        log.info(f'setContrastColor({color})')
+        self.parent.setContrastColor(color)
+        # Update menu display and save setting
+        self.menu.clearContrastColor.setEnabled(color is not None)
+        self.storage.setValue('contrastColor', color.hexa if color else '')
+        self.storage.sync()
+
+    def updateRecentColors(self):
+        """ Rebuild the recent colors menu from the color history. """
+        self.menu.recentColors.clear()
+        for color in self.parent.history.recent(10):
+            action = QtGui.QAction(color.format(self.parent.cformat), self.parent)
+            action.triggered.connect(partial(self.parent.setColor, color))
+            self.menu.recentColors.addAction(action)
+
     def updateColorFormats(self, color):
         """ Update the color format choices to match current color. """
         for action in self.menu.colorFormats.actions():
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import abc
+import numpy
+import re
+from colorpecker import log  # noqa
+from colorpecker.utils import array2qimage, qimage2array
+from collections import OrderedDict
+from os.path import basename, getsize
+from PySide6 import QtCore, QtGui
+
+RAWEXTENSIONS = ('.raw', '.rgba')
+REGEX_SIZE = re.compile(r'(\d+)x(\d+)')
+
+
+class TiledImage(abc.ABC):
+    """ Read-only image decoded in tiles on demand. Recently used tiles are
+        kept in an LRU cache so memory use is bounded by tilesize and
+        maxtiles rather than the size of the image. Subclasses implement
+        _decodeTile() and _sampled().
+    """
+
+    def __init__(self, filepath, width, height, tilesize=256, maxtiles=64):
+        self.filepath = filepath        # Source filepath
+        self.width = width              # Image width in pixels
+        self.height = height            # Image height in pixels
+        self.tilesize = tilesize        # Width and height of each tile
+        self.maxtiles = maxtiles        # Max tiles kept in the cache
+        self._tiles = OrderedDict()     # LRU cache of {(tx,ty): array}
+
+    def __str__(self):
+        return f'{self.__class__.__name__}({basename(self.filepath)}, {self.width}x{self.height})'
+
+    def tile(self, tx, ty):
+        """ Returns the (h, w, 4) uint8 RGBA array for tile (tx, ty). """
+        key = (tx, ty)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        x, y = tx*self.tilesize, ty*self.tilesize
+        w, h = min(self.tilesize, self.width-x), min(self.tilesize, self.height-y)
+        self._tiles[key] = self._decodeTile(x, y, w, h)
+        while len(self._tiles) > self.maxtiles:
+            self._tiles.popitem(last=False)
+        return self._tiles[key]
+
+    def crop(self, x, y, w, h):
+        """ Returns the (h, w, 4) uint8 RGBA array at x, y. Pixels outside
+            the image are fully transparent.
+        """
+        result = numpy.zeros((h, w, 4), numpy.uint8)
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x+w, self.width), min(y+h, self.height)
+        if x1 >= x2 or y1 >= y2:
+            return result
+        size = self.tilesize
+        for ty in range(y1 // size, (y2-1) // size + 1):
+            for tx in range(x1 // size, (x2-1) // size + 1):
+                tile = self.tile(tx, ty)
+                tx1, ty1 = max(x1, tx*size), max(y1, ty*size)
+                tx2, ty2 = min(x2, tx*size+tile.shape[1]), min(y2, ty*size+tile.shape[0])
+                result[ty1-y:ty2-y, tx1-x:tx2-x] = tile[ty1-ty*size:ty2-ty*size, tx1-tx*size:tx2-tx*size]
+        return result
+
+    def cropImage(self, x, y, w, h):
+        """ Returns crop() as a QImage. """
+        return array2qimage(self.crop(x, y, w, h))
+
+    def overview(self, maxsize=1024):
+        """ Returns a QImage preview of the full image no larger than maxsize
+            in either dimension. This reads every step pixels rather than
+            decoding every tile.
+        """
+        step = max(1, -(-max(self.width, self.height) // maxsize))
+        return array2qimage(self._sampled(step))
+
+    @abc.abstractmethod
+    def _decodeTile(self, x, y, w, h):
+        """ Returns the (h, w, 4) uint8 RGBA array at x, y. """
+
+    @abc.abstractmethod
+    def _sampled(self, step):
+        """ Returns every step pixels of the image as an RGBA array. """
+
+
+class RawImage(TiledImage):
+    """ Raw RGBA dump memory-mapped from disk. The OS pages in only the rows
+        touched by the tiles we decode, so any size image can be opened.
+    """
+
+    def __init__(self, filepath, width, height, offset=0, **kwargs):
+        super(RawImage, self).__init__(filepath, width, height, **kwargs)
+        expected = offset + width*height*4
+        if getsize(filepath) < expected:
+            raise Exception(f'Raw image {filepath} is smaller than {width}x{height} RGBA')
+        self._data = numpy.memmap(filepath, numpy.uint8, 'r', offset, (height, width, 4))
+
+    def _decodeTile(self, x, y, w, h):
+        return numpy.array(self._data[y:y+h, x:x+w])
+
+    def _sampled(self, step):
+        return numpy.array(self._data[::step, ::step])
+
+
+class QtImage(TiledImage):
+    """ Image file read with QImageReader. When the format supports reading
+        a clip rect (jpeg) each tile is decoded separately. Otherwise (png,
+        tiff) Qt can only decode the full image, so it is decoded once and
+        tiles are sliced from it. Those are refused when larger than the
+        QImageReader allocation limit, convert them to a raw dump instead.
+    """
+
+    def __init__(self, filepath, **kwargs):
+        reader = QtGui.QImageReader(filepath)
+        size = reader.size()
+        if not reader.canRead() or not size.isValid():
+            raise Exception(f'Unable to read image: {filepath}')
+        super(QtImage, self).__init__(filepath, size.width(), size.height(), **kwargs)
+        self._cliprect = reader.supportsOption(QtGui.QImageIOHandler.ClipRect)
+        self._qimage = None             # Full decoded QImage backing self._image
+        self._image = None              # RGBA array view of self._qimage
+        if not self._cliprect:
+            self._checkLimit()
+            self._qimage = self._readImage()
+            self._image = qimage2array(self._qimage, copy=False)
+
+    def _checkLimit(self):
+        """ Raise if decoding the full image would exceed the QImageReader
+            allocation limit. Qt would refuse to read it anyway, this says
+            how to open it instead.
+        """
+        limit = QtGui.QImageReader.allocationLimit() * 1048576
+        if limit and self.width * self.height * 4 > limit:
+            raise Exception(f'Image {basename(self.filepath)} is {self.width}x{self.height}, too large to '
+                f'decode whole. Convert it to a raw RGBA dump named like image.{self.width}x{self.height}.rgba '
+                f'(magick {basename(self.filepath)} -depth 8 rgba:image.{self.width}x{self.height}.rgba)')
+
+    def _read(self, rect=None, size=None):
+        """ Decode the image or part of it to a RGBA array. """
+        return qimage2array(self._readImage(rect, size))
+
+    def _readImage(self, rect=None, size=None):
+        """ Decode the image or part of it to a RGBA8888 QImage. """
+        reader = QtGui.QImageReader(self.filepath)
+        if rect is not None: reader.setClipRect(rect)
+        if size is not None: reader.setScaledSize(size)
+        image = reader.read()
+        if image.isNull():
+            raise Exception(f'Unable to read image {self.filepath}: {reader.errorString()}')
+        return image.convertToFormat(QtGui.QImage.Format_RGBA8888)
+
+    def _decodeTile(self, x, y, w, h):
+        if self._image is not None:
+            return self._image[y:y+h, x:x+w].copy()
+        return self._read(rect=QtCore.QRect(x, y, w, h))
+
+    def _sampled(self, step):
+        if self._image is not None:
+            return self._image[::step, ::step].copy()
+        return self._read(size=QtCore.QSize(-(-self.width // step), -(-self.height // step)))
+
+
+def openImage(filepath, width=None, height=None, **kwargs):
+    """ Open an image file as a TiledImage. Raw RGBA dumps (.raw, .rgba)
+        need a width and height, which are read from the filename when it
+        contains them (image.4096x4096.rgba).
+    """
+    if filepath.lower().endswith(RAWEXTENSIONS):
+        if width is None or height is None:
+            if not (matches := re.findall(REGEX_SIZE, basename(filepath))):
+                raise Exception(f'Unknown raw image size: {filepath}')
+            width, height = (int(x) for x in matches[-1])
+        return RawImage(filepath, width, height, **kwargs)
+    return QtImage(filepath, **kwargs)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import numpy
+from colorpecker import log  # noqa
+from PySide6 import QtGui
+
+
+def array2qimage(array):
+    """ Returns a QImage copy of a (h, w, 4) uint8 RGBA array. """
+    array = numpy.ascontiguousarray(array)
+    height, width = array.shape[:2]
+    image = QtGui.QImage(array.data, width, height, width*4, QtGui.QImage.Format_RGBA8888)
+    return image.copy()
+
+
+def qimage2array(image, copy=True):
+    """ Returns a (height, width, 4) uint8 RGBA numpy array copied from the
+        specified QImage or filepath. Any row padding Qt adds is stripped.
+        With copy=False a RGBA8888 image is returned as a view of its pixels,
+        the QImage must be kept alive while the view is used.
+    """
+    if isinstance(image, str):
+        filepath, image = image, QtGui.QImage(image)
+        if image.isNull():
+            raise Exception(f'Unable to load image: {filepath}')
+    image = image.convertToFormat(QtGui.QImage.Format_RGBA8888)
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    buffer = numpy.frombuffer(image.constBits(), numpy.uint8, count=stride*height)
+    array = buffer.reshape(height, stride)[:, :width*4].reshape(height, width, 4)
+    return array.copy() if copy else array
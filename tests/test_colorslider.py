@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Headless checks that a ColorPicker slider drag step emits exactly one
+# valueChanged and one colorChanged, with no cascade through the other
+# sliders or the slider and spinbox inside each ColorSlider.
+import os
+import pytest
+from collections import Counter
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('qtemplate')
+from PySide6.QtCore import QStandardPaths  # noqa
+from PySide6.QtWidgets import QApplication  # noqa
+QStandardPaths.setTestModeEnabled(True)  # Keep the color history out of the user's storage
+from colorpecker.colorpicker import ColorPicker  # noqa
+from colorpecker.colorslider import ColorSlider  # noqa
+
+# Drag steps as (slider id, value, shift held)
+DRAGSTEPS = [('rgb_r', 140, False), ('rgb_g', 70, False), ('rgb_b', 10, False), ('rgb_g', 90, True), ('a', 50, False)]
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def picker(app):
+    picker = ColorPicker((0.5, 0.25, 0.75))
+    yield picker
+    picker.deleteLater()
+
+
+def countSignals(picker):
+    """ Returns a Counter of the signals emitted by the picker, every
+        ColorSlider and the slider and spinbox inside each one.
+    """
+    counts = Counter()
+    picker.colorChanged.connect(lambda color: counts.update(['colorChanged']))
+    for slider in picker.findChildren(ColorSlider):
+        name = slider.objectName()
+        slider.valueChanged.connect(lambda v, name=name: counts.update([f'{name}.valueChanged']))
+        slider.ids.slider.valueChanged.connect(lambda v, name=name: counts.update([f'{name}.slider']))
+        slider.ids.spinbox.valueChanged.connect(lambda v, name=name: counts.update([f'{name}.spinbox']))
+    return counts
+
+
+@pytest.mark.parametrize('id,value,shift', DRAGSTEPS)
+def test_dragStepEmitsOnce(picker, id, value, shift):
+    counts = countSignals(picker)
+    picker._shiftColor = picker.color if shift else None
+    picker.ids[id].ids.slider.setValue(value)
+    picker._shiftColor = None
+    assert counts.pop('colorChanged') == 1
+    assert counts.pop(f'{id}.slider') == 1
+    assert counts.pop(f'{id}.valueChanged') == 1
+    assert not +counts, f'Unexpected emissions: {dict(counts)}'
+
+
+def test_dragSequenceEmitsOncePerStep(picker):
+    counts = countSignals(picker)
+    slider = picker.ids.rgb_r
+    values = [value for value in range(0, 256, 5) if value != slider.value]
+    for value in values:
+        slider.ids.slider.setValue(value)
+    assert counts['rgb_r.valueChanged'] == len(values)
+    assert counts['colorChanged'] == len(values)
+
+
+def test_setValuesEmitsNothing(picker):
+    counts = countSignals(picker)
+    sliders = (picker.ids.rgb_r, picker.ids.rgb_g, picker.ids.rgb_b)
+    ColorSlider.setValues({slider: 200 for slider in sliders})
+    assert [slider.value for slider in sliders] == [200, 200, 200]
+    assert not +counts, f'Unexpected emissions: {dict(counts)}'
+
+
+def test_blockUpdatesEmitsFinalValueOnce(picker):
+    slider = picker.ids.rgb_r
+    values = []
+    slider.valueChanged.connect(values.append)
+    with slider.blockUpdates():
+        for value in (10, 20, 30):
+            slider.setValue(value)
+    assert values == [30]